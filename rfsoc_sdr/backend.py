@@ -0,0 +1,18 @@
+# Hardware backend : PYNQ, or the simulated board of sim.py
+#
+# The simulated backend is only used with the environment variable RFSOC_SDR_BACKEND=sim (e.g. on a computer, or on
+# the board for benchmarks), it must be set before importing sdr_overlay or dc. Without it PYNQ is required : a
+# missing PYNQ raises the ImportError instead of silently running on the simulated board.
+
+import os
+
+if os.environ.get("RFSOC_SDR_BACKEND", "pynq") == "sim":
+    from sim import Overlay, MMIO, xrfclk, xrfdc
+else:
+    try:
+        from pynq import Overlay
+        from pynq import MMIO
+        import xrfclk
+        import xrfdc
+    except ImportError as error:
+        raise ImportError(f"{error} : PYNQ is required, set RFSOC_SDR_BACKEND=sim to use the simulated board (see sim.py)") from error
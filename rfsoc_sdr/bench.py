@@ -0,0 +1,367 @@
+# Benchmarks of the data formatting and memory I/O functions, run on the simulated board (see sim.py)
+#
+# Usage :
+#   python bench.py                                run the suite (32k, 512k and 16M 32 bits samples)
+#   python bench.py --save results.json            save the results (JSON)
+#   python bench.py --baseline results.json        compare with saved results, exit code 1 on a regression
+#   python bench.py --compare                      check the vectorized memory functions against the word by word ones
+#   python bench.py --help                         all the options (sizes, kernels, threshold, ...)
+
+import sys
+import os
+import json
+import platform
+import argparse
+import tempfile
+import shutil
+import contextlib
+import io
+from datetime import datetime
+from time import perf_counter
+import numpy as np
+
+# The benchmarks always run on the simulated board, by default its memories are files in a temporary directory
+_SIM_DIR_CREATED = "RFSOC_SDR_SIM_DIR" not in os.environ
+os.environ.setdefault("RFSOC_SDR_BACKEND", "sim")
+os.environ.setdefault("RFSOC_SDR_SIM_DIR", os.path.join(tempfile.gettempdir(), f"rfsoc_sdr_bench_{os.getpid()}"))
+
+from backend import MMIO
+from dc import dac_bram_write, dac_bram_write_bulk, ddr4_write, ddr4_write_stream, adc_bram_read, adc_bram_read_IQ
+from data import sin_gen, concat, complex_to_dc_32bits_format, read_file, write_file, read_hex_file_to_numpy_array
+from dsp import interpolate
+from noise import Noise
+from sim import MmapMMIO
+
+
+def _measure(func, *args, repeat=3):
+    """ Return the best execution time (in s) of func(*args) over 'repeat' runs """
+    best = float("inf")
+    for _ in range(repeat):
+        start = perf_counter()
+        func(*args)
+        best = min(best, perf_counter() - start)
+    return best
+
+def _report(name, number_of_32bits_samples, t):
+    print(f"\t{name:<24} {t*1e3:10.2f} ms {number_of_32bits_samples/t/1e6:10.2f} M samples/s {number_of_32bits_samples*4/t/1e6:10.2f} MB/s")
+
+# Word by word readers (the previous versions of adc_bram_read and adc_bram_read_IQ), kept as reference
+
+def _int16(halfword):
+    """ Signed value of a 16 bits halfword """
+    return (halfword ^ 0x8000) - 0x8000
+
+def adc_bram_read_loop(bram_mmio, number_of_32_bits_samples):
+    adc_data_read = np.zeros(2 * number_of_32_bits_samples, np.int16)
+    for i in range(number_of_32_bits_samples):
+        current_data = bram_mmio.read(i*4) & 0xFFFFFFFF
+        adc_data_read[i*2 + 0] = _int16(current_data & 0x0000_FFFF)
+        adc_data_read[i*2 + 1] = _int16((current_data >> 16) & 0x0000_FFFF)
+    return adc_data_read
+
+def adc_bram_read_IQ_loop(bram_mmio, number_of_32_bits_samples):
+    size = number_of_32_bits_samples
+    I = np.zeros(size, dtype = np.int16)
+    Q = np.zeros(size, dtype = np.int16)
+    for i in range(0, size//8):
+        for k in range(4):
+            current_data = bram_mmio.read((i*8+k)*4) & 0xFFFFFFFF
+            I[8*i + 2*k] = _int16(current_data & 0x0000_FFFF)
+            I[8*i + 2*k+1] = _int16((current_data >> 16) & 0x0000_FFFF)
+        for k in range(4):
+            current_data = bram_mmio.read((i*8+k+4)*4) & 0xFFFFFFFF
+            Q[8*i + 2*k] = _int16(current_data & 0x0000_FFFF)
+            Q[8*i + 2*k+1] = _int16((current_data >> 16) & 0x0000_FFFF)
+    return I + 1j * Q
+
+
+def bench_dac_bram_write(number_of_32bits_samples=32768, repeat=3):
+    """Compare dac_bram_write and dac_bram_write_bulk on a file-backed URAM(0) 2M (DAC 13).
+
+    Returns:
+        (float, float): best time of dac_bram_write and of dac_bram_write_bulk (in s)
+    """
+    data = np.random.randint(-2**31, 2**31, number_of_32bits_samples, dtype=np.int64).astype(np.int32)
+    with tempfile.TemporaryDirectory() as tmp:
+        mem_loop = MmapMMIO(0xA100_0000, 0x0020_0000, os.path.join(tmp, "loop.bin"))
+        mem_bulk = MmapMMIO(0xA100_0000, 0x0020_0000, os.path.join(tmp, "bulk.bin"))
+
+        t_loop = _measure(dac_bram_write, mem_loop, data, repeat=repeat)
+        t_bulk = _measure(dac_bram_write_bulk, mem_bulk, data, repeat=repeat)
+
+        if not np.array_equal(mem_loop.array, mem_bulk.array):
+            raise AssertionError("dac_bram_write and dac_bram_write_bulk memory contents differ")
+        mem_loop.close()
+        mem_bulk.close()
+
+    print(f"DAC BRAM/URAM write ({number_of_32bits_samples} 32 bits samples) :")
+    _report("dac_bram_write", number_of_32bits_samples, t_loop)
+    _report("dac_bram_write_bulk", number_of_32bits_samples, t_bulk)
+    print(f"\tspeedup : x{t_loop/t_bulk:.1f}")
+    return t_loop, t_bulk
+
+def bench_adc_bram_read(number_of_32bits_samples=None, repeat=3):
+    """Compare the vectorized ADC readers with the word by word ones on a file-backed ADC BRAM(0) 1M.
+
+    By default the whole BRAM is read back.
+
+    Returns:
+        dict: best times (in s) of each reader
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        mem = MmapMMIO(0xA020_0000, 0x0010_0000, os.path.join(tmp, "adc.bin"))
+        if number_of_32bits_samples is None:
+            number_of_32bits_samples = mem.array.size // 8 * 8
+        mem.array[:] = np.random.randint(0, 2**32, mem.array.size, dtype=np.uint64).astype(np.uint32)
+
+        results = {}
+        for name, reader in [("adc_bram_read_loop", adc_bram_read_loop), ("adc_bram_read", adc_bram_read),
+                             ("adc_bram_read_IQ_loop", adc_bram_read_IQ_loop), ("adc_bram_read_IQ", adc_bram_read_IQ)]:
+            # the word by word readers are slow, one run is enough
+            results[name] = _measure(reader, mem, number_of_32bits_samples, repeat=1 if name.endswith("_loop") else repeat)
+
+        if not np.array_equal(adc_bram_read_loop(mem, number_of_32bits_samples), adc_bram_read(mem, number_of_32bits_samples)):
+            raise AssertionError("adc_bram_read output differs from the word by word reader")
+        if not np.array_equal(adc_bram_read_IQ_loop(mem, number_of_32bits_samples), adc_bram_read_IQ(mem, number_of_32bits_samples)):
+            raise AssertionError("adc_bram_read_IQ output differs from the word by word reader")
+        mem.close()
+
+    print(f"ADC BRAM read ({number_of_32bits_samples} 32 bits samples) :")
+    for name, t in results.items():
+        _report(name, number_of_32bits_samples, t)
+    print(f"\tspeedup : x{results['adc_bram_read_loop']/results['adc_bram_read']:.1f} (Real), x{results['adc_bram_read_IQ_loop']/results['adc_bram_read_IQ']:.1f} (IQ)")
+    return results
+
+
+
+### Benchmark suite ###
+
+SIZES = [32 * 1024, 512 * 1024, 16 * 1024 * 1024]
+
+
+class _Skip(Exception):
+    """ Raised by a benchmark setup when a size is not relevant (e.g. bigger than the memory) """
+    pass
+
+def _random_words(size):
+    return np.random.randint(-2**31, 2**31, size, dtype=np.int64).astype(np.int32)
+
+def _mmio(base_addr, length, size):
+    """ Simulated memory region of the board, _Skip if size does not fit in it """
+    mem = MMIO(base_addr, length)
+    if size > mem.array.size:
+        raise _Skip(f"bigger than the memory ({mem.array.size} 32 bits samples)")
+    return mem
+
+_sdr = None
+
+def _sdr_overlay():
+    """ SdrOverlay on the simulated board (created once, its prints are hidden) """
+    global _sdr
+    if _sdr is None:
+        from sdr_overlay import SdrOverlay
+        with contextlib.redirect_stdout(io.StringIO()):
+            _sdr = SdrOverlay("simulated.bit")
+    return _sdr
+
+# Each setup(size, tmp) prepares the inputs for 'size' 32 bits samples and returns the function to time
+
+def _setup_dac_bram_write(size, tmp):
+    mem, data = _mmio(0xA120_0000, 0x0008_0000, size), _random_words(size)  # URAM(1), DAC 02
+    return lambda: dac_bram_write(mem, data)
+
+def _setup_dac_bram_write_bulk(size, tmp):
+    mem, data = _mmio(0xA120_0000, 0x0008_0000, size), _random_words(size)
+    return lambda: dac_bram_write_bulk(mem, data)
+
+def _setup_ddr4_write(size, tmp):
+    mem, data = _mmio(0x4_0000_0000, 0x1_0000_0000, size), _random_words(size)  # DDR4(0), DAC 12
+    return lambda: ddr4_write(mem, data)
+
+def _setup_ddr4_write_stream(size, tmp):
+    mem, data = _mmio(0x4_0000_0000, 0x1_0000_0000, size), _random_words(size)
+    return lambda: ddr4_write_stream(mem, data, verbose=False)
+
+def _setup_adc_bram_read(size, tmp):
+    mem = _mmio(0xA020_0000, 0x0010_0000, size)  # ADC BRAM(0)
+    return lambda: adc_bram_read(mem, size)
+
+def _setup_adc_bram_read_IQ(size, tmp):
+    mem = _mmio(0xA020_0000, 0x0010_0000, size)
+    return lambda: adc_bram_read_IQ(mem, size)
+
+def _setup_sin_gen(size, tmp):
+    # 64 samples per period, 2 int16 samples per 32 bits sample
+    return lambda: sin_gen(Fs=4096e6, f=64e6, number_of_periods=2 * size // 64)
+
+def _setup_concat(size, tmp):
+    array16 = np.random.randint(-2**15, 2**15, 2 * size).astype(np.int16)
+    return lambda: concat(array16)
+
+def _setup_complex_to_dc_32bits_format(size, tmp):
+    signal = (np.random.randn(size) + 1j * np.random.randn(size)) * 8000
+    return lambda: complex_to_dc_32bits_format(signal)
+
+def _setup_interpolate(size, tmp):
+    # size output samples, interpolation by 4 of complex64 samples
+    signal = ((np.random.randn(size // 4) + 1j * np.random.randn(size // 4)) * 8000).astype(np.complex64)
+    return lambda: interpolate(signal, 4)
+
+def _setup_noise_sweep(size, tmp):
+    # size complex64 output samples : 16 SNRs of a waveform of size // 16 samples
+    signal = (np.random.randn(size // 16) + 1j * np.random.randn(size // 16)).astype(np.complex64)
+    noise, snr = Noise(seed=0), np.arange(16)
+    return lambda: noise.sweep(signal, snr)
+
+def _setup_read_file(size, tmp):
+    file_name = os.path.join(tmp, f"dec_{size}.txt")
+    if not os.path.exists(file_name):
+        write_file(file_name, _random_words(size))
+    return lambda: read_file(file_name)
+
+def _setup_read_hex_file_to_numpy_array(size, tmp):
+    # Format of the MATLAB function of the README (0xLLLLHHHH,)
+    file_name = os.path.join(tmp, f"hex_{size}.txt")
+    if not os.path.exists(file_name):
+        np.savetxt(file_name, _random_words(size).view(np.uint32), fmt="0x%08X,")
+    return lambda: read_hex_file_to_numpy_array(file_name)
+
+def _setup_get_data_IQ(size, tmp):
+    sdr = _sdr_overlay()
+    _mmio(0xA020_0000, 0x0010_0000, size)
+    return lambda: sdr.get_data(size, mode="IQ")
+
+def _setup_get_data_Real(size, tmp):
+    sdr = _sdr_overlay()
+    _mmio(0xA020_0000, 0x0010_0000, size)
+    return lambda: sdr.get_data(size, mode="Real")
+
+BENCHMARKS = {
+    "dc.dac_bram_write": _setup_dac_bram_write,
+    "dc.dac_bram_write_bulk": _setup_dac_bram_write_bulk,
+    "dc.ddr4_write": _setup_ddr4_write,
+    "dc.ddr4_write_stream": _setup_ddr4_write_stream,
+    "dc.adc_bram_read": _setup_adc_bram_read,
+    "dc.adc_bram_read_IQ": _setup_adc_bram_read_IQ,
+    "data.sin_gen": _setup_sin_gen,
+    "data.concat": _setup_concat,
+    "data.complex_to_dc_32bits_format": _setup_complex_to_dc_32bits_format,
+    "dsp.interpolate": _setup_interpolate,
+    "noise.Noise.sweep": _setup_noise_sweep,
+    "data.read_file": _setup_read_file,
+    "data.read_hex_file_to_numpy_array": _setup_read_hex_file_to_numpy_array,
+    "SdrOverlay.get_data(IQ)": _setup_get_data_IQ,
+    "SdrOverlay.get_data(Real)": _setup_get_data_Real,
+}
+
+def run_suite(sizes=SIZES, kernels=None, budget=30.0, repeat=3):
+    """Run the benchmarks of BENCHMARKS for each size.
+
+    Args:
+        sizes (list, optional): numbers of 32 bits samples. Defaults to SIZES.
+        kernels (list, optional): names of the benchmarks to run. Defaults to None (all).
+        budget (float, optional): a size is skipped when its time, extrapolated from the previous size, is above budget (s). Defaults to 30.
+        repeat (int, optional): number of runs (the best one is kept), a run longer than 1 s is not repeated. Defaults to 3.
+
+    Returns:
+        dict: results by "kernel@size" : time_s, samples_per_s and mb_per_s (or skipped/error)
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, setup in BENCHMARKS.items():
+            if kernels and name not in kernels:
+                continue
+            previous = None
+            for size in sorted(sizes):
+                key = f"{name}@{size}"
+                try:
+                    if previous is not None and previous[1] * size / previous[0] > budget:
+                        raise _Skip(f"estimated time above the budget ({budget} s)")
+                    func = setup(size, tmp)
+                    t = _measure(func, repeat=1)
+                    if t < 1.0 and repeat > 1:
+                        t = min(t, _measure(func, repeat=repeat - 1))
+                except _Skip as skip:
+                    results[key] = {"size": size, "skipped": str(skip)}
+                    print(f"{key:<48} skipped : {skip}")
+                    continue
+                except Exception as error:
+                    results[key] = {"size": size, "error": repr(error)}
+                    print(f"{key:<48} error : {error!r}")
+                    continue
+                previous = (size, t)
+                results[key] = {"size": size, "time_s": t, "samples_per_s": size / t, "mb_per_s": size * 4 / t / 1e6}
+                print(f"{key:<48} {t*1e3:12.3f} ms {size/t/1e6:12.2f} M samples/s {size*4/t/1e6:12.2f} MB/s")
+    return results
+
+def save_results(file_name, results):
+    """ Save the results of run_suite in a JSON file with the platform description """
+    report = {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "results": results,
+    }
+    with open(file_name, "w") as f:
+        json.dump(report, f, indent=2)
+
+def compare_with_baseline(results, baseline_file, threshold=0.25):
+    """Compare results with the ones saved in baseline_file.
+
+    Args:
+        results (dict): output of run_suite
+        baseline_file (str): JSON file written by save_results
+        threshold (float, optional): maximum allowed slowdown (0.25 = 25 % slower). Defaults to 0.25.
+
+    Returns:
+        list: the "kernel@size" keys slower than the baseline by more than the threshold
+    """
+    with open(baseline_file) as f:
+        baseline = json.load(f)["results"]
+    regressions = []
+    print(f"\nComparison with {baseline_file} (threshold {threshold*100:.0f} %) :")
+    for key, result in results.items():
+        if "time_s" not in result or "time_s" not in baseline.get(key, {}):
+            continue
+        ratio = result["time_s"] / baseline[key]["time_s"]
+        status = "REGRESSION" if ratio > 1 + threshold else "ok"
+        if status != "ok":
+            regressions.append(key)
+        print(f"\t{key:<48} x{ratio:8.2f} time  {status}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of the data formatting and memory I/O functions (simulated board)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="numbers of 32 bits samples")
+    parser.add_argument("--kernels", nargs="+", default=None, help=f"benchmarks to run, in {list(BENCHMARKS)}")
+    parser.add_argument("--budget", type=float, default=30.0, help="skip a size whose estimated time is above this budget (s)")
+    parser.add_argument("--repeat", type=int, default=3, help="number of runs, the best one is kept")
+    parser.add_argument("--save", default=None, help="JSON file for the results")
+    parser.add_argument("--baseline", default=None, help="JSON file of previous results to compare with")
+    parser.add_argument("--threshold", type=float, default=0.25, help="maximum allowed slowdown compared to the baseline")
+    parser.add_argument("--compare", action="store_true", help="check the vectorized memory functions against the word by word ones")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.compare:
+            bench_dac_bram_write()
+            bench_adc_bram_read()
+            return 0
+        results = run_suite(args.sizes, args.kernels, args.budget, args.repeat)
+        if args.save:
+            save_results(args.save, results)
+        if args.baseline:
+            regressions = compare_with_baseline(results, args.baseline, args.threshold)
+            if regressions:
+                print(f"{len(regressions)} regression(s) : {regressions}")
+                return 1
+        return 0
+    finally:
+        if _SIM_DIR_CREATED:
+            shutil.rmtree(os.environ["RFSOC_SDR_SIM_DIR"], ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,6 @@
 import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib.colors import LogNorm
 import commpy as cp
 from scipy.io import savemat, loadmat
 import scipy.signal as sig
@@ -7,6 +8,12 @@ import scipy.signal as sig
 # Utility
 from time import sleep
 import os
+import binascii
+
+from packing import int16_to_int32, int32_to_int16, complex_to_int32
+from dsp import IIRFilter
+from spectrum import psd, amplitude_spectrum
+from noise import Noise
 
 
 def concat(array16):
@@ -21,49 +28,92 @@ def concat(array16):
     Returns
     -------
     array32 : 1-D ndarray (int32)
-        Array containing the concatenation of pairs of 16-bit int elements.
+        Array containing the concatenation of pairs of 16-bit int elements
+        (a view of array16 when it is a contiguous int16 array, see packing.py).
+    """
+
+    return int16_to_int32(array16)
+
+def sin_gen(Fs=1024e6, f=6.4e6, number_of_periods=10, plot=False, amplitude=1.0, phase=0.0, number_of_samples=None, output="int32", chunk_size=1 << 20):
+    """Generate a sinus (or a sum of sinus) ready to be loaded in a DAC memory.
+
+    The signal is periodic over the N 16 bits samples : each frequency is rounded to the nearest k * Fs / N
+    (a warning is printed if it changes), so there is no phase jump when the DAC memory loops. The phase is
+    computed from (k * n) % N with integers, it is exact whatever the length of the memory.
+
+    Args:
+        Fs (float, optional): sampling rate of the DAC (Hz). Defaults to 1024e6.
+        f (float or list, optional): frequency of the tone(s) (Hz). Defaults to 6.4e6.
+        number_of_periods (int, optional): number of periods of the first tone, gives N = number_of_periods * Fs / f. Defaults to 10.
+        plot (bool, optional): plot one period of the first tone. Defaults to False.
+        amplitude (float or list, optional): amplitude of each tone, 1 is the full scale of the 14 bits DAC. Defaults to 1.0.
+        phase (float or list, optional): phase of each tone (rad). Defaults to 0.0.
+        number_of_samples (int, optional): number of 16 bits samples N (replaces number_of_periods). Defaults to None.
+        output (str, optional): "int32" : 2 samples of 14 bits packed in each int32 (the DAC format),
+            "float32" : the N samples normalized to the full scale (not clipped). Defaults to "int32".
+        chunk_size (int, optional): number of 16 bits samples computed at once (limits the temporary memory). Defaults to 1 << 20.
+
+    Returns:
+        ndarray: N // 2 int32 or N float32 samples
     """
+    f = np.atleast_1d(np.asarray(f, dtype=np.float64))
+    amplitude = np.broadcast_to(np.asarray(amplitude, dtype=np.float64), f.shape)
+    phase = np.broadcast_to(np.asarray(phase, dtype=np.float64), f.shape)
+    if number_of_samples is None:
+        N = int(number_of_periods * Fs / f[0])
+    else:
+        N = int(number_of_samples)
+    if (output == "int32" and N % 2 != 0):
+        raise ValueError("The number of 16 bits samples must be even to be packed in int32")
+    if (output not in ("int32", "float32")):
+        raise ValueError("output must be \"int32\" or \"float32\"")
+
+    # Number of cycles of each tone in the N samples
+    k = np.rint(f * N / Fs).astype(np.int64)
+    if np.any(np.abs(k * Fs / N - f) > 1e-9 * Fs):
+        print(f"WARNING : the frequencies are rounded to {k * Fs / N} Hz to keep the phase continuous when the memory loops")
+    if (output == "int32" and np.sum(np.abs(amplitude)) > 1):
+        print("WARNING : the sum of the amplitudes is greater than 1, the signal is clipped")
 
-    N = int(array16.size//2)
-    array32 = np.zeros(N, dtype=np.int32)
-    for n in range(N):
-        array32[n] = ((array16[2*n+1] << 16) & 0xFFFF_0000) | ((array16[2*n]) & 0x0000_FFFF)
-    return array32
-
-def sin_gen(Fs=1024e6, f=6.4e6, number_of_periods=10, plot=False):
-    # if ((Fs/f) % 1 != 0):
-    #     print("The number of 16 bits samples in one period must be an integer ! Fs/f = ",  Fs / f)
-    N_one_period = int(Fs / f)
-    N = int(number_of_periods * Fs / f)
-    # print("N = ", N)
     max_val_16bit_signed = 2**13 - 1
-    sinus = np.zeros(N, dtype=np.int16)
-    for n in range(N):
-        value = np.sin(2 * np.pi * f * n / Fs) * max_val_16bit_signed
-        sinus[n] = int(value) << 2
+    if (output == "int32"):
+        sinus_32bit = np.empty(N // 2, dtype=np.int32)
+        # Little endian : the even samples are the low 16 bits of each int32
+        sinus = sinus_32bit.view(np.int16)
+    else:
+        sinus = np.empty(N, dtype=np.float32)
+
+    for start in range(0, N, chunk_size):
+        n = np.arange(start, min(start + chunk_size, N), dtype=np.int64)
+        value = np.zeros(n.size)
+        for k_tone, a, p in zip(k, amplitude, phase):
+            value += a * np.sin(2 * np.pi / N * ((k_tone * n) % N) + p)
+        if (output == "int32"):
+            np.clip(value, -1, 1, out=value)
+            value *= max_val_16bit_signed
+        # Same rounding as int() (towards 0) for the int16 samples
+        sinus[start:start + n.size] = value
+    if (output == "int32"):
+        # 14 bits samples in the high bits
+        np.left_shift(sinus, 2, out=sinus)
+
     if (plot):
-        plt.plot(sinus[:N_one_period])
+        plt.plot(sinus[:int(Fs / f[0])])
         plt.show()
-    sinus_32bit = np.zeros(N // 2, dtype=np.int32)
-    for i in range(0, N, 2):
-        high = np.int32(sinus[i + 1]) << 16
-        low = np.int32(sinus[i] & 0xFFFF)
-        sinus_32bit[i // 2] = high | low
-    return sinus_32bit
+    if (output == "int32"):
+        return sinus_32bit
+    return sinus
 
 
 def LPF(signal, fc, Fs):
-    """ Low Pass Filter """
-    o = 5  # order of the filter
-    fc = np.array([fc])
-    wn = 2 * fc / Fs
-    [b, a] = sig.butter(o, wn, btype='lowpass')
-    [W, h] = sig.freqz(b, a, worN=1024)
-    W = Fs * W / (2 * np.pi)
-    signal_filt = sig.lfilter(b, a, signal)
+    """ Low Pass Filter (5th order Butterworth), to filter consecutive captures as one signal use dsp.IIRFilter """
+    lpf = IIRFilter(fc, Fs, order=5)
+    signal_filt = lpf.process(signal)
+    W, h = lpf.frequency_response(1024)
     return signal_filt, W, h
 
 
+# Replaced by tx.py (QamTx and qam_gen)
 # def qam_gen(N=6400, mod_order=16, samples_per_symbol=4, rolloff_factor=0.25, filter_span=20, plot=False):
 #     """Generate a 1-D ndarray of np.int32 data of QAM modulation for the DAC insite an RFSOC (Xinlinx FPGA)
 
@@ -159,11 +209,9 @@ def LPF(signal, fc, Fs):
 #     return complex_array
 
 
-def complex_to_dc_32bits_format(complex_array):
-    data = np.zeros(complex_array.size, dtype=np.int32)
-    for n in range(complex_array.size):
-        data[n] = ((np.real(complex_array[n]) << 16) & 0xFFFF_0000) | ((np.imag(complex_array[n])) & 0x0000_FFFF)
-    return data
+def complex_to_dc_32bits_format(complex_array, scale=1.0):
+    """ I (real part) in the high 16 bits and Q (imaginary part) in the low 16 bits, rounded and saturated (see packing.py) """
+    return complex_to_int32(complex_array, scale=scale)
 
 def mat_to_dc_data(file_path):
     return complex_to_dc_32bits_format(mat_to_numpy(file_path))
@@ -180,7 +228,7 @@ def qam16symbols(N=1024, plot=False):
                   3-3j,  3-1j,  3+3j,  3+1j,
                   1-3j,  1-1j,  1+3j,  1+1j]
     ints = np.random.randint(0, 16, N)
-    qam_symbols = [qam_scheme[i] for i in ints]
+    qam_symbols = np.array(qam_scheme)[ints]
     if (plot):
         # Plot the mapped symbols
         plt.figure(figsize=(5, 5))
@@ -193,23 +241,14 @@ def qam16symbols(N=1024, plot=False):
     return qam_symbols
 
 
-def complex_noise(N, noise_power):
-    complex_noise = np.sqrt(noise_power/2)*(np.random.randn(N) +
-                                            np.random.randn(N)*1j)
-    return complex_noise
-
+def complex_noise(N, noise_power, seed=None, dtype=np.complex128):
+    """ N samples of complex gaussian noise of power noise_power (see noise.Noise, seed : int or np.random.Generator) """
+    return Noise(seed, dtype).generate(N, noise_power)
 
-def awgn(signal, snr=20):
-    sig_power = np.mean(np.abs(signal)**2)
-    sig_power_db = 10 * np.log10(sig_power)
 
-    noise_power_db = sig_power_db - snr
-    noise_power = 10**(noise_power_db / 10)
-
-    complex_noise = np.sqrt(noise_power/2)*(np.random.randn(len(signal)) +
-                                            np.random.randn(len(signal))*1j)
-
-    return signal + complex_noise
+def awgn(signal, snr=20, seed=None, dtype=np.complex128):
+    """ signal + complex gaussian noise at snr dB (see noise.Noise.add and noise.Noise.sweep for several SNRs) """
+    return Noise(seed, dtype).add(signal, snr)
 
 
 def calculate_evm(symbols_tx, symbols_rx):
@@ -220,13 +259,14 @@ def calculate_evm(symbols_tx, symbols_rx):
 
 
 def upsampler(Ns, K, symbols):
-    up = np.zeros(Ns * K)
+    """ Zero stuffing (keeps complex symbols complex), to interpolate prefer dsp.interpolate (polyphase, no multiplication by the zeros) """
+    up = np.zeros(Ns * K, dtype=np.result_type(np.asarray(symbols).dtype, np.float64))
     up[::K] = symbols
     return up
 
 
 def check_storage_capacity(array):
-    """ array must be fill with 32 bits data, the return value is in Mbytes"""
+    """ array must be fill with 32 bits data, the return value is in Mbytes (see SdrOverlay.memory_utilization for the DAC memories)"""
     size = array.size * 32 / (8e6)  # Mbytes
     return size
 
@@ -237,35 +277,98 @@ def check_storage_capacity(array):
 
 #####################################################################################################################################################
 
-def plot_32bits(bram_data):
-    bram_data_16 = np.zeros(int(bram_data.size * 2), np.int16)
+# Maximum number of points of a plotted line (about 2 per pixel of a wide figure), see envelope
+MAX_PLOT_POINTS = 4000
+
+
+def envelope(y, x=None, max_points=MAX_PLOT_POINTS):
+    """Reduce a long trace to its min/max envelope for plotting : the peaks (spurs) stay visible, unlike y[::div].
 
-    for n in range(int(bram_data.size)):
-        bram_data_16[n*2 + 0] = np.int16(bram_data[n] & 0xFFFF)
-        bram_data_16[n*2 + 1] = np.int16((bram_data[n] >> 16) & 0xFFFF)
+    The samples are split in max_points // 2 bins, each bin gives its minimum and its maximum.
+
+    Args:
+        y (ndarray): real samples
+        x (ndarray, optional): abscissa of the samples. Defaults to None (indices).
+        max_points (int, optional): maximum number of points returned. Defaults to MAX_PLOT_POINTS.
+
+    Returns:
+        tuple: (x, y) unchanged if y has max_points samples or less
+    """
+    y = np.asarray(y)
+    x = np.arange(y.size) if x is None else np.asarray(x)
+    if (y.size <= max_points):
+        return x, y
+    bins = max_points // 2
+    starts = np.arange(bins) * y.size // bins
+    y_envelope = np.empty(2 * bins, dtype=y.dtype)
+    y_envelope[0::2] = np.minimum.reduceat(y, starts)
+    y_envelope[1::2] = np.maximum.reduceat(y, starts)
+    return np.repeat(x[starts], 2), y_envelope
+
+
+def density(signal, bins=256, extent=None):
+    """2-D histogram of the points of a constellation (to draw instead of one marker per point).
+
+    Args:
+        signal (ndarray): complex samples
+        bins (int, optional): number of bins on each axis. Defaults to 256.
+        extent (float, optional): the histogram covers [-extent, extent] on both axes. Defaults to None (the max of |I| and |Q|).
+
+    Returns:
+        tuple: (H, edges) number of points per bin (H[i, q]) and the bin edges (same on both axes)
+    """
+    signal = np.ravel(signal)
+    if extent is None:
+        extent = max(np.max(np.abs(signal.real)), np.max(np.abs(signal.imag)))
+    edges = np.linspace(-extent, extent, bins + 1)
+    H, _, _ = np.histogram2d(signal.real, signal.imag, bins=[edges, edges])
+    return H, edges
 
-    plt.plot(bram_data_16)
+
+def plot_32bits(bram_data, max_points=MAX_PLOT_POINTS):
+    bram_data_16 = int32_to_int16(bram_data)
+
+    plt.plot(*envelope(bram_data_16, max_points=max_points))
     plt.show()
 
 
-def plot_fft(signal, Fs=1, M=0, title="FFT", opt="log"):
-    if M == 0:
-        M = signal.size
+def plot_fft(signal, Fs=1, M=0, title="FFT", opt="log", window=None, max_points=MAX_PLOT_POINTS):
+    """ Plot the FFT magnitude of signal (M points, one-sided for a real signal, min/max envelope above max_points), the values are given by spectrum.amplitude_spectrum """
+    if opt not in ("log", "lin"):
+        return
+    f, magnitude = amplitude_spectrum(signal, Fs, nfft=M, window=window)
     if (opt == "log"):
-        y = 10*np.log10(np.abs(np.fft.fftshift(np.fft.fft(signal, M))))
-    elif (opt == "lin"):
-        y = np.abs(np.fft.fftshift(np.fft.fft(signal, M)))
+        y = 10*np.log10(magnitude)
     else:
-        return
-    plt.plot(np.linspace(-Fs / 2, Fs / 2, M), y)
+        y = magnitude
+    plt.plot(*envelope(y, f, max_points))
     plt.title(title)
     plt.xlabel("f (Hz)")
     plt.ylabel(f"Amplitude ({opt})")
     plt.show()
 
 
-def plot_scatter(signal, title="constellation"):
-    plt.scatter(np.real(signal), np.imag(signal))
+def plot_psd(signal, Fs=1, nperseg=4096, title="PSD", max_points=MAX_PLOT_POINTS, **kwargs):
+    """ Plot the Welch averaged PSD of signal in dB (see spectrum.psd for kwargs) and return (f, Pxx) """
+    f, Pxx = psd(signal, Fs, nperseg=nperseg, **kwargs)
+    plt.plot(*envelope(10*np.log10(Pxx), f, max_points))
+    plt.title(title)
+    plt.xlabel("f (Hz)")
+    plt.ylabel("PSD (dB/Hz)")
+    plt.show()
+    return f, Pxx
+
+
+def plot_scatter(signal, title="constellation", max_points=10000):
+    """ Scatter plot of a constellation, a density image (see density) above max_points points """
+    if (np.size(signal) > max_points):
+        H, edges = density(signal)
+        # Empty bins are not drawn, log scale to see the isolated points
+        plt.imshow(np.ma.masked_equal(H.T, 0), origin="lower", extent=[edges[0], edges[-1], edges[0], edges[-1]],
+                   norm=LogNorm(), cmap="viridis")
+        plt.colorbar(label="points")
+    else:
+        plt.scatter(np.real(signal), np.imag(signal))
     plt.title(title)
     plt.xlabel("I")
     plt.ylabel("Q")
@@ -298,13 +401,117 @@ def read_file(file_name):
     return np.array(data, dtype=np.int32)
 
 
-def read_hex_file_to_numpy_array(file_path):
-    with open(file_path, 'r') as file:
-        lines = file.readlines()
-    data = [int(line.strip().rstrip(','), 16) for line in lines]
-    numpy_array = np.array(data, dtype=np.uint32)
+def read_hex_file_to_numpy_array(file_path, swap_halfwords=False):
+    return read_hex_file(file_path, swap_halfwords=swap_halfwords)
+
+
+def _hex_line_layout(line):
+    """Structured dtype of a fixed width line (like 0xLLLLHHHH,) and the expected value of its other fields.
 
-    return numpy_array
+    The 8 digits are the field "hex", the other bytes (prefix, comma, end of line) are integer fields compared
+    with the first line. Returns None if the line is not a word of 8 hex digits.
+    """
+    text = line.rstrip(b"\r\n").rstrip(b",")
+    start = 2 if text[:2].lower() == b"0x" else 0
+    if (not line.endswith(b"\n") or len(text) != start + 8):
+        return None
+    try:
+        binascii.unhexlify(text[start:])
+    except binascii.Error:
+        return None
+
+    names, formats, offsets, expected = ["hex"], ["V8"], [start], {}
+    for offset, stop in [(0, start), (start + 8, len(line))]:
+        while (offset < stop):
+            size = max(n for n in (1, 2, 4, 8) if n <= stop - offset)
+            name = f"b{offset}"
+            names.append(name)
+            formats.append(f"<u{size}")
+            offsets.append(offset)
+            expected[name] = int.from_bytes(line[offset:offset + size], "little")
+            offset += size
+    return np.dtype({"names": names, "formats": formats, "offsets": offsets, "itemsize": len(line)}), expected
+
+
+def _parse_hex_lines(block, layout, file_name, first_line):
+    """ Words of a block of complete lines, first_line is the number of the first line (for the error messages) """
+    if layout is not None and len(block) % layout[0].itemsize == 0:
+        dtype, expected = layout
+        lines = np.frombuffer(block, dtype=dtype)
+        if all(np.all(lines[name] == value) for name, value in expected.items()):
+            try:
+                # 4 bytes per word, most significant byte first
+                return np.frombuffer(binascii.unhexlify(np.ascontiguousarray(lines["hex"])), dtype=">u4").astype(np.uint32)
+            except binascii.Error:
+                pass
+
+    # Any other layout (variable width, blank lines, signed values, ...) or a malformed line, line by line
+    words = []
+    for n, line in enumerate(block.split(b"\n")[:-1]):
+        text = line.strip().rstrip(b",")
+        if not text:
+            continue
+        try:
+            value = int(text, 16)
+        except ValueError:
+            value = None
+        if value is None or not (-2**31 <= value < 2**32):
+            raise ValueError(f"{file_name}, line {first_line + n} : malformed hex word {line.decode(errors='replace')!r}")
+        words.append(value & 0xFFFF_FFFF)
+    return np.array(words, dtype=np.uint32)
+
+
+def read_hex_file(file_name, out=None, swap_halfwords=False, chunk_size=1 << 22):
+    """Read a file with one hex word per line (e.g. 0xLLLLHHHH, written by the MATLAB function of the README).
+
+    The file is read by chunks of chunk_size bytes. The chunks where all the lines have the same layout as the
+    first one are decoded in bulk (hundreds of MB/s), the other ones line by line with int(line, 16).
+
+    Args:
+        file_name (str)
+        out (ndarray uint32, optional): preallocated array or np.memmap, big enough for all the words. Defaults to None (allocated).
+        swap_halfwords (bool, optional): swap the 16 bits halves of each word. Defaults to False.
+        chunk_size (int, optional): number of bytes read at once. Defaults to 4 MB.
+
+    Returns:
+        ndarray uint32: the words (out[:number of words] if out is given)
+    """
+    with open(file_name, "rb") as f:
+        first = f.readline()
+    layout = _hex_line_layout(first)
+    terminator = b"\r\n" if first.endswith(b"\r\n") else b"\n"
+    allocated = out is None
+    if allocated:
+        out = np.empty(os.path.getsize(file_name) // max(len(first), 1) + 1, dtype=np.uint32)
+
+    number_of_words = 0
+    line_number = 1
+    rest = b""
+    with open(file_name, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if chunk:
+                block = rest + chunk
+                cut = block.rfind(b"\n") + 1
+                block, rest = block[:cut], block[cut:]
+            else:
+                block = (rest.rstrip() + terminator) if rest.strip() else b""
+            if block:
+                words = _parse_hex_lines(block, layout, file_name, line_number)
+                line_number += block.count(b"\n")
+                if (number_of_words + words.size > out.size):
+                    if not allocated:
+                        raise ValueError(f"out is too small : more than {out.size} words in {file_name}")
+                    out = np.resize(out, max(2 * out.size, number_of_words + words.size))
+                out[number_of_words:number_of_words + words.size] = words
+                number_of_words += words.size
+            if not chunk:
+                break
+
+    data = out[:number_of_words]
+    if swap_halfwords:
+        data[...] = (data >> 16) | (data << 16)
+    return data
 
 
 def save_numpy_to_mat(filename, array):
@@ -8,15 +8,11 @@ import commpy as cp
 from scipy.io import savemat
 import scipy.signal as sig
 
-# PYNQ
-from pynq import Overlay
-from pynq import MMIO
-from pynq import allocate
-import xrfclk
-import xrfdc
+# PYNQ (or the simulated board, see backend.py)
+from backend import Overlay, MMIO, xrfclk, xrfdc
 
 # Utility 
-from time import sleep
+from time import sleep, perf_counter
 import os
 
 def print_lmx_lmk():
@@ -123,6 +119,32 @@ def dac_bram_write(bram_mmio, bram_data):
         bram_mmio.write(n*ratio*4 + 6*4, int(bram_data[n*ratio + 30]) & 0xFFFFFFFF)
         bram_mmio.write(n*ratio*4 + 7*4, int(bram_data[n*ratio + 31]) & 0xFFFFFFFF)
 
+# Word order of a 1024 bits line for the FIFO 1024 to 256 : the four 256 bits lanes are reversed
+# (it is the same permutation as the one written by hand in dac_bram_write)
+BRAM_LINE_ORDER = np.arange(1024 // 32).reshape(4, 8)[::-1].ravel()
+
+def dac_bram_write_bulk(bram_mmio, bram_data, word_offset=0):
+    """Vectorized version of dac_bram_write : write the content of a 1-D ndarray into a PL Ram (BRAM or Uram).
+
+    The lane order of every 1024 bits line is applied to the whole array at once with BRAM_LINE_ORDER,
+    then the result is copied into the memory region in a single operation through the numpy view
+    of the MMIO (bram_mmio.array). As with dac_bram_write, an incomplete last line is not written.
+
+    Args:
+        bram_mmio (pynq.MMIO): memory region of the DAC driver
+        bram_data (numpy.ndarray int32): data already formatted in the correct int32 format
+        word_offset (int, optional): position (in 32 bits samples) of bram_data in the memory, multiple of 32. Defaults to 0.
+    """
+    ratio = int(1024/32)
+    if word_offset % ratio != 0:
+        raise ValueError("word_offset must be a multiple of 1024/32 = 32")
+    size = bram_data.size // ratio * ratio
+    memory = bram_mmio.array
+    if word_offset + size > memory.size:
+        raise ValueError(f"{word_offset + size} 32 bits samples do not fit in the memory ({memory.size} 32 bits samples max)")
+    lines = np.asarray(bram_data[:size]).astype(np.uint32, copy=False).reshape(-1, ratio)
+    memory[word_offset:word_offset + size] = lines[:, BRAM_LINE_ORDER].ravel()
+
 def ddr4_write(ddr4_mmio, data):
     # FIFO 512 to 256
     for n in range(int(data.size/16)):
@@ -144,6 +166,90 @@ def ddr4_write(ddr4_mmio, data):
         ddr4_mmio.write(n*16*4 + 4*14, int(data[n*16 +6]))
         ddr4_mmio.write(n*16*4 + 4*15, int(data[n*16 +7]))
 
+def _iter_chunks(source, chunk_size):
+    """ Yield 1-D chunks of at most chunk_size elements from an ndarray (np.memmap included) or an iterable of blocks """
+    if isinstance(source, np.ndarray):
+        source = source.reshape(-1)
+        for start in range(0, source.size, chunk_size):
+            yield source[start:start + chunk_size]
+    else:
+        for block in source:
+            block = np.asarray(block).reshape(-1)
+            for start in range(0, block.size, chunk_size):
+                yield block[start:start + chunk_size]
+
+def ddr4_write_stream(ddr4_mmio, source, ddr4_controller=None, chunk_size=1 << 20, verbose=True, word_offset=0):
+    """Chunked version of ddr4_write : stream a waveform into the DDR4 with a bounded memory usage.
+
+    Each chunk is written straight into the memory region (ddr4_mmio.array) with its two 256 bits lanes
+    swapped by a vectorized copy, so the waveform never has to be in RAM as a whole. Blocks of any size
+    are accepted, only an incomplete last 512 bits line is dropped (like ddr4_write).
+
+    Args:
+        ddr4_mmio (pynq.MMIO): DDR4 memory region (dac_mem_12)
+        source (numpy.ndarray or iterable): int32 waveform, np.memmap of a waveform file or any iterable of int32 blocks
+        ddr4_controller (pynq.MMIO, optional): if given, the DDR4 controller is set with the number of 32 bits samples written. Defaults to None.
+        chunk_size (int, optional): maximum number of 32 bits samples written at once. Defaults to 1M.
+        verbose (bool, optional): print the progress and the throughput (MB/s). Defaults to True.
+        word_offset (int, optional): position (in 32 bits samples) of the waveform in the DDR4, multiple of 16.
+            The controller is always set with the number of samples written from this position. Defaults to 0.
+
+    Returns:
+        int: the number of 32 bits samples written
+    """
+    ratio = int(512/32)
+    if word_offset % ratio != 0:
+        raise ValueError("word_offset must be a multiple of 512/32 = 16")
+    chunk_size = max(chunk_size // ratio, 1) * ratio
+    memory = ddr4_mmio.array
+    pending = np.zeros(ratio, dtype=np.uint32)  # start of a 512 bits line split between two blocks
+    n_pending = 0
+    offset = word_offset
+
+    def write_lines(lines):
+        nonlocal offset
+        size = lines.size
+        if offset + size > memory.size:
+            raise ValueError(f"The waveform does not fit in the DDR4 ({memory.size} 32 bits samples max)")
+        # FIFO 512 to 256 : the two 256 bits lanes are swapped
+        memory[offset:offset + size].reshape(-1, 2, 8)[:] = lines.reshape(-1, 2, 8)[:, ::-1]
+        offset += size
+
+    start = perf_counter()
+    last_print = start
+    for chunk in _iter_chunks(source, chunk_size):
+        if n_pending:
+            take = min(ratio - n_pending, chunk.size)
+            pending[n_pending:n_pending + take] = chunk[:take]
+            n_pending += take
+            chunk = chunk[take:]
+            if n_pending == ratio:
+                write_lines(pending)
+                n_pending = 0
+        if chunk.size:
+            size = chunk.size // ratio * ratio
+            if size:
+                write_lines(chunk[:size])
+            n_pending = chunk.size - size
+            pending[:n_pending] = chunk[size:]
+        if verbose and perf_counter() - last_print > 0.5:
+            last_print = perf_counter()
+            elapsed = last_print - start
+            print(f"\rDDR4 : {(offset - word_offset)*4/1e6:.1f} MB written ({(offset - word_offset)*4/1e6/max(elapsed, 1e-9):.1f} MB/s)", end="")
+
+    written = offset - word_offset
+    elapsed = perf_counter() - start
+    if verbose:
+        print(f"\rDDR4 : {written*4/1e6:.1f} MB written in {elapsed:.2f} s ({written*4/1e6/max(elapsed, 1e-9):.1f} MB/s)")
+    if n_pending:
+        print(f"WARNING : the last {n_pending} 32 bits samples are not written, the DDR4 needs a multiple of 512/32 = 16 32 bits samples")
+
+    if ddr4_controller is not None:
+        if written == 0:
+            raise ValueError("No data written in the DDR4, the controller can't be set")
+        set_ddr4_controller(ddr4_controller, written)
+    return written
+
 # Read
 
 # def set_bram_adc_capture_maximum(counter_mmio, max):
@@ -160,37 +266,75 @@ def ddr4_write(ddr4_mmio, data):
 #     set_bram_adc_capture_maximum(counter_mmio, max)
 #     start_bram_adc_capture(counter_mmio)
 
-def adc_bram_read(bram_mmio, number_of_32_bits_samples):
-    """ Only for REAL DATA """
-    number_of_16_bits_samples = 2 * number_of_32_bits_samples
-    adc_data_read = np.zeros(number_of_16_bits_samples, np.int16)
-
-    for i in range(0, int(number_of_16_bits_samples//2)):
-        current_data = bram_mmio.read(i*4) & 0xFFFFFFFF
-        current_data = bram_mmio.read(i*4) & 0xFFFFFFFF
-        low = current_data & 0x0000_FFFF
-        high = (current_data >> 16) & 0x0000_FFFF
-        adc_data_read[i*2 + 0] = np.int16(low)
-        adc_data_read[i*2 + 1] = np.int16(high)
-    return adc_data_read
-
-def adc_bram_read_IQ(bram_mmio, number_of_32_bits_samples):
+def _mmio_read_words(mmio, number_of_32_bits_samples):
+    """ Copy the first 32 bits words of a MMIO region into a new uint32 ndarray in a single bulk read """
+    memory = mmio.array
+    if number_of_32_bits_samples > memory.size:
+        raise ValueError(f"The memory only contains {memory.size} 32 bits samples")
+    return np.array(memory[:number_of_32_bits_samples])
+
+def _check_out(out, size, dtype):
+    """ Check a caller-provided output buffer and return its first 'size' elements """
+    if not isinstance(out, np.ndarray) or out.ndim != 1 or not out.flags.c_contiguous:
+        raise ValueError("out must be a contiguous 1-D ndarray")
+    if np.dtype(dtype).kind == "c":
+        if out.dtype.kind != "c":
+            raise ValueError("out must be a complex ndarray")
+    elif out.dtype != dtype:
+        raise ValueError(f"out must be a {np.dtype(dtype)} ndarray")
+    if out.size < size:
+        raise ValueError(f"out is too small ({out.size} < {size})")
+    return out[:size]
+
+def adc_bram_read(bram_mmio, number_of_32_bits_samples, out=None):
+    """ Only for REAL DATA
+
+    The capture is copied once from the BRAM, each 32 bits word holds two int16 samples (low halfword first).
+    A preallocated int16 ndarray of at least 2*number_of_32_bits_samples elements can be given with 'out'.
+    """
+    if out is None:
+        return _mmio_read_words(bram_mmio, number_of_32_bits_samples).view(np.int16)
+    out = _check_out(out, 2 * number_of_32_bits_samples, np.int16)
+    out.view(np.uint32)[:] = bram_mmio.array[:number_of_32_bits_samples]
+    return out
+
+def adc_bram_read_real(bram_mmio, number_of_32_bits_samples, out=None):
+    """ Read a Real mode capture : only the first 128 bits of each 256 bits word hold samples (the complex part is 0)
+
+    The samples are copied with a single strided copy from the BRAM, the result holds number_of_32_bits_samples int16.
+    A preallocated int16 ndarray can be given with 'out'.
+    """
+    if number_of_32_bits_samples % 8 != 0:
+        raise ValueError("In Real mode the number of 32 bits samples must be a multiple of 256/32 = 8")
+    memory = bram_mmio.array
+    if number_of_32_bits_samples > memory.size:
+        raise ValueError(f"The memory only contains {memory.size} 32 bits samples")
+    if out is None:
+        out = np.empty(number_of_32_bits_samples, dtype=np.int16)
+    else:
+        out = _check_out(out, number_of_32_bits_samples, np.int16)
+    out.view(np.uint32).reshape(-1, 4)[:] = memory[:number_of_32_bits_samples].reshape(-1, 8)[:, :4]
+    return out
+
+def adc_bram_read_IQ(bram_mmio, number_of_32_bits_samples, out=None):
+    """ Read an IQ capture : each 256 bits word holds 4 words of I (8 int16) followed by 4 words of Q (8 int16)
+
+    The capture is copied once from the BRAM, then I and Q are de-interleaved with reshaped views.
+    As before, an incomplete last 256 bits word is left at 0.
+    A preallocated complex ndarray (complex64 or complex128) can be given with 'out'.
+    """
     size = number_of_32_bits_samples
-    I = np.zeros(size, dtype = np.int16)
-    Q = np.zeros(size, dtype = np.int16)
-    for i in range(0, size//8):
-        for k in range(4):
-            current_data = bram_mmio.read((i*8+k)*4) & 0xFFFFFFFF
-            current_data = bram_mmio.read((i*8+k)*4) & 0xFFFFFFFF
-            I[8*i + 2*k] = current_data & 0x0000_FFFF
-            I[8*i + 2*k+1] = (current_data >> 16) & 0x0000_FFFF
-        for k in range(4):
-            current_data = bram_mmio.read((i*8+k+4)*4) & 0xFFFFFFFF
-            current_data = bram_mmio.read((i*8+k+4)*4) & 0xFFFFFFFF
-            Q[8*i + 2*k] = current_data & 0x0000_FFFF
-            Q[8*i + 2*k+1] = (current_data >> 16) & 0x0000_FFFF
-    return I + 1j * Q
-        
+    n = size // 8 * 8
+    samples = _mmio_read_words(bram_mmio, n).view(np.int16).reshape(-1, 2, 8)
+    if out is None:
+        data = np.zeros(size, dtype=np.complex128)
+    else:
+        data = _check_out(out, size, np.complex128)
+        data[n:] = 0
+    data.real[:n].reshape(-1, 8)[:] = samples[:, 0]
+    data.imag[:n].reshape(-1, 8)[:] = samples[:, 1]
+    return data
+
 
 ### Controller (counter) :
 
@@ -0,0 +1,272 @@
+# Polyphase resampling (interpolation, decimation and rational resampling) and IIR filters
+#
+# The filter is applied with scipy.signal.upfirdn : the zeros inserted by the interpolation are never multiplied
+# and the samples removed by the decimation are never computed. Complex signals stay complex.
+# PolyphaseResampler and IIRFilter keep the state of the previous chunk, so a long signal (or consecutive ADC
+# captures) can be processed chunk by chunk.
+
+from fractions import Fraction
+from functools import lru_cache
+from math import gcd
+
+import numpy as np
+from scipy.signal import firwin, upfirdn, butter, sosfilt, sosfreqz
+
+# Filter banks already built, by (up, down, taps), see _filter_bank
+_FILTER_BANKS = {}
+
+
+def design_filter(up, down=1):
+    """Low pass filter of the rational resampling up/down (same design as scipy.signal.resample_poly).
+
+    Args:
+        up (int): interpolation factor
+        down (int, optional): decimation factor. Defaults to 1.
+
+    Returns:
+        ndarray: the taps (cutoff 1/max(up, down), gain up)
+    """
+    max_rate = max(up, down)
+    if (max_rate == 1):
+        return np.ones(1)
+    half_len = 10 * max_rate
+    return firwin(2 * half_len + 1, 1.0 / max_rate, window=("kaiser", 5.0)) * up
+
+
+def _filter_bank(up, down, taps):
+    """ (taps, delay) : taps padded so the delay of the filter is a whole number of output samples """
+    key = (up, down, None if taps is None else np.asarray(taps).tobytes())
+    if key not in _FILTER_BANKS:
+        taps = design_filter(up, down) if taps is None else np.asarray(taps, dtype=np.float64)
+        half_len = (taps.size - 1) // 2
+        pad = -half_len % down
+        bank = np.concatenate([np.zeros(pad), taps])
+        # upfirdn gives at least one output per input sample only if the filter has up taps
+        if (bank.size < up):
+            bank = np.concatenate([bank, np.zeros(up - bank.size)])
+        bank.flags.writeable = False
+        _FILTER_BANKS[key] = (bank, (half_len + pad) // down)
+    return _FILTER_BANKS[key]
+
+
+class PolyphaseResampler:
+    """Streaming polyphase resampler : process the signal chunk by chunk, the output is the same as in one call.
+
+    Example:
+        resampler = PolyphaseResampler(up=5, down=4)
+        for chunk in chunks:
+            y = resampler.process(chunk)
+        y = resampler.flush()
+
+    The output is the causal filtering of the upsampled signal : the first delay output samples are the
+    transient of the filter (see resample for an output aligned with the input).
+    """
+
+    def __init__(self, up, down=1, taps=None):
+        """Get the filter bank of the ratio up/down (built once per ratio and taps).
+
+        Args:
+            up (int): interpolation factor
+            down (int, optional): decimation factor. Defaults to 1.
+            taps (ndarray, optional): filter taps used as is (at the upsampled rate). Defaults to None (design_filter, gain up).
+        """
+        if (up < 1 or down < 1):
+            raise ValueError("up and down must be positive integers")
+        if taps is None:
+            # Same filter for 4/2 and 2/1
+            common = gcd(up, down)
+            up, down = up // common, down // common
+        self.up = up
+        self.down = down
+        self.taps, self.delay = _filter_bank(up, down, taps)
+        # Number of input samples needed by one output sample
+        self._span = -(-self.taps.size // up)
+        # The history starts on a multiple of _step inputs, so its first output sample is an integer
+        self._step = down // gcd(up, down)
+        self.reset()
+
+    def reset(self):
+        """ Forget the previous samples (start of a new signal) """
+        self._history = np.zeros(0)
+        self._history_start = 0
+        self._number_of_inputs = 0
+        self._number_of_outputs = 0
+
+    def _filter(self, buffer):
+        if np.iscomplexobj(buffer):
+            # 2 real filterings are faster than a complex one
+            real = upfirdn(self.taps, buffer.real, self.up, self.down)
+            y = np.empty(real.size, dtype=np.result_type(buffer.dtype, np.complex64))
+            y.real = real
+            y.imag = upfirdn(self.taps, buffer.imag, self.up, self.down)
+            return y
+        return upfirdn(self.taps, buffer, self.up, self.down)
+
+    def process(self, x):
+        """Resample the next chunk of the signal.
+
+        Args:
+            x (ndarray): real or complex samples
+
+        Returns:
+            ndarray: the output samples that only depend on the samples received so far
+        """
+        x = np.asarray(x)
+        buffer = np.concatenate([self._history, x]) if self._history.size else x
+        self._number_of_inputs += x.size
+        end = -(-self._number_of_inputs * self.up // self.down)
+        return self._output(buffer, end)
+
+    def flush(self):
+        """Last output samples (the end of the filter transient), then reset the resampler.
+
+        Returns:
+            ndarray: the remaining output samples of the full convolution
+        """
+        if (self._number_of_inputs == 0):
+            return np.zeros(0)
+        end = ((self._number_of_inputs - 1) * self.up + self.taps.size - 1) // self.down + 1
+        buffer = np.concatenate([self._history, np.zeros(self._span + self._step, dtype=self._history.dtype)])
+        y = self._output(buffer, end)
+        self.reset()
+        return y
+
+    def _output(self, buffer, end):
+        # Output index of the first sample of buffer
+        first = self._history_start * self.up // self.down
+        y = self._filter(buffer)[self._number_of_outputs - first:end - first]
+        self._number_of_outputs = end
+
+        # Keep the inputs needed by the next outputs, from a multiple of _step
+        needed = -(-(end * self.down - self.taps.size + 1) // self.up)
+        start = max(needed // self._step * self._step, self._history_start)
+        self._history = buffer[start - self._history_start:].copy()
+        self._history_start = start
+        return y
+
+
+def resample(x, up, down=1, taps=None):
+    """Resample x by up/down, the output is aligned with the input (like scipy.signal.resample_poly).
+
+    Args:
+        x (ndarray): real or complex samples
+        up (int): interpolation factor
+        down (int, optional): decimation factor. Defaults to 1.
+        taps (ndarray, optional): filter taps used as is. Defaults to None (design_filter, gain up).
+
+    Returns:
+        ndarray: ceil(x.size * up / down) samples
+    """
+    resampler = PolyphaseResampler(up, down, taps)
+    y = np.concatenate([resampler.process(x), resampler.flush()])
+    size = -(-np.size(x) * resampler.up // resampler.down)
+    return y[resampler.delay:resampler.delay + size]
+
+
+def interpolate(x, factor, taps=None):
+    """ Interpolation by an integer factor (see resample) """
+    return resample(x, factor, 1, taps)
+
+
+def decimate(x, factor, taps=None):
+    """ Filtering and decimation by an integer factor (see resample) """
+    return resample(x, 1, factor, taps)
+
+
+def resample_to_rate(x, Fs_in, Fs_out, max_denominator=1000, taps=None):
+    """Resample a signal sampled at Fs_in to Fs_out (e.g. the rate of a DAC tile, see SdrOverlay.match_dac_rate).
+
+    Args:
+        x (ndarray): real or complex samples
+        Fs_in (float): sampling rate of x
+        Fs_out (float): sampling rate wanted (same unit as Fs_in)
+        max_denominator (int, optional): maximum up and down factors of the ratio. Defaults to 1000.
+        taps (ndarray, optional): filter taps used as is. Defaults to None (design_filter).
+
+    Returns:
+        ndarray: the resampled signal
+    """
+    ratio = Fraction(Fs_out / Fs_in).limit_denominator(max_denominator)
+    if (abs(float(ratio) * Fs_in - Fs_out) > 1e-9 * Fs_out):
+        print(f"WARNING : the ratio is rounded to {ratio.numerator}/{ratio.denominator}, output rate = {float(ratio) * Fs_in}")
+    return resample(x, ratio.numerator, ratio.denominator, taps)
+
+
+### IIR filters ###
+
+@lru_cache(maxsize=64)
+def design_sos(btype, order, cutoff, Fs):
+    """Butterworth filter in second order sections (cached, the designs are read only).
+
+    Args:
+        btype (str): "lowpass", "highpass", "bandpass" or "bandstop"
+        order (int): order of the filter
+        cutoff (float or tuple): cutoff frequency (a tuple of 2 for bandpass and bandstop)
+        Fs (float): sampling rate (same unit as cutoff)
+
+    Returns:
+        ndarray: sos array of shape (number of sections, 6)
+    """
+    sos = butter(order, cutoff, btype=btype, output="sos", fs=Fs)
+    sos.flags.writeable = False
+    return sos
+
+
+@lru_cache(maxsize=64)
+def _frequency_response(btype, order, cutoff, Fs, worN):
+    W, h = sosfreqz(design_sos(btype, order, cutoff, Fs), worN=worN, fs=Fs)
+    W.flags.writeable = False
+    h.flags.writeable = False
+    return W, h
+
+
+class IIRFilter:
+    """Butterworth filter (second order sections) keeping its state between the calls of process.
+
+    Example:
+        lpf = IIRFilter(fc=300, Fs=1024)
+        for capture in sdr.capture_stream(4096, count=10):
+            y = lpf.process(capture)
+    """
+
+    def __init__(self, fc, Fs, order=5, btype="lowpass", dtype=np.float64):
+        """Get the design of the filter (built once per (btype, order, fc, Fs)).
+
+        Args:
+            fc (float or tuple): cutoff frequency (a tuple of 2 for bandpass and bandstop)
+            Fs (float): sampling rate (same unit as fc)
+            order (int, optional): Defaults to 5.
+            btype (str, optional): "lowpass", "highpass", "bandpass" or "bandstop". Defaults to "lowpass".
+            dtype (dtype, optional): np.float32 or np.float64, precision of the filtering (complex signals stay complex). Defaults to np.float64.
+        """
+        if np.dtype(dtype) not in (np.float32, np.float64):
+            raise ValueError("dtype must be np.float32 or np.float64")
+        self.key = (btype, order, tuple(np.atleast_1d(fc).tolist()) if np.ndim(fc) else float(fc), float(Fs))
+        self.dtype = np.dtype(dtype)
+        self.sos = design_sos(*self.key).astype(self.dtype)
+        self.zi = None
+
+    def frequency_response(self, worN=1024):
+        """ (W, h) : frequencies (same unit as Fs) and complex response, computed at the first call (cached) """
+        return _frequency_response(*self.key, worN)
+
+    def reset(self):
+        """ Forget the state (start of a new signal) """
+        self.zi = None
+
+    def process(self, x):
+        """Filter the next chunk of the signal, continuing from the state of the previous one.
+
+        Args:
+            x (ndarray): real or complex samples
+
+        Returns:
+            ndarray: the filtered samples (float32/float64 or complex64/complex128, see dtype)
+        """
+        x = np.asarray(x)
+        dtype = np.result_type(self.dtype, np.complex64) if np.iscomplexobj(x) else self.dtype
+        x = x.astype(dtype, copy=False)
+        if self.zi is None or self.zi.dtype != dtype:
+            self.zi = np.zeros((self.sos.shape[0], 2), dtype=dtype)
+        y, self.zi = sosfilt(self.sos, x, zi=self.zi)
+        return y
@@ -0,0 +1,122 @@
+# Additive white gaussian noise from a np.random.Generator (seedable, reproducible)
+#
+# The noise is drawn directly in float32/float64 (complex64/complex128 : the real and imaginary parts are drawn in
+# one call in the float view of the output), it can be added in place and a whole stack of noisy copies of one
+# waveform at several SNRs is drawn in one call (see Noise.sweep, e.g. for BER vs SNR curves with rx.QamRx).
+
+import numpy as np
+
+# Number of samples of noise drawn at once by Noise.add(inplace=True) (limits the temporary memory)
+CHUNK_SIZE = 1 << 20
+
+
+def noise_power(signal_power, snr):
+    """ Noise power giving the SNR(s) in dB for a signal of power signal_power """
+    return signal_power * 10**(-np.asarray(snr, dtype=np.float64) / 10)
+
+
+class Noise:
+    """Gaussian noise source.
+
+    Example:
+        noise = Noise(seed=1)
+        noisy = noise.sweep(tx_signal, snr=np.arange(0, 21, 2))     # one row per SNR
+        result = rx.demodulate(noisy)
+        plt.semilogy(np.arange(0, 21, 2), result["ber"])
+    """
+
+    def __init__(self, seed=None, dtype=np.complex64):
+        """
+        Args:
+            seed (int or np.random.Generator, optional): seed of the generator, or the generator itself. Defaults to None.
+            dtype (dtype, optional): np.float32, np.float64 (real noise), np.complex64 or np.complex128. Defaults to np.complex64.
+        """
+        if np.dtype(dtype) not in (np.float32, np.float64, np.complex64, np.complex128):
+            raise ValueError("dtype must be np.float32, np.float64, np.complex64 or np.complex128")
+        self.rng = np.random.default_rng(seed)
+        self.dtype = np.dtype(dtype)
+
+    def _standard(self, out):
+        """ Fill out with unit power noise (variance 1/2 on each part of a complex sample) """
+        if np.iscomplexobj(out):
+            parts = out.view(out.real.dtype)
+            self.rng.standard_normal(dtype=parts.dtype, out=parts)
+            parts *= np.sqrt(0.5, dtype=parts.dtype)
+        else:
+            self.rng.standard_normal(dtype=out.dtype, out=out)
+        return out
+
+    def generate(self, shape, power=1.0, out=None):
+        """Noise of power power.
+
+        Args:
+            shape (int or tuple): shape of the output
+            power (float, optional): mean of |noise|**2. Defaults to 1.0.
+            out (ndarray, optional): contiguous output array of dtype self.dtype. Defaults to None.
+
+        Returns:
+            ndarray: the noise
+        """
+        if out is None:
+            out = np.empty(shape, dtype=self.dtype)
+        elif out.dtype != self.dtype or not out.flags.c_contiguous or out.shape != tuple(np.atleast_1d(shape)):
+            raise ValueError(f"out must be a contiguous {self.dtype} array of shape {shape}")
+        self._standard(out)
+        out *= out.real.dtype.type(np.sqrt(power))
+        return out
+
+    def _check(self, signal):
+        if np.iscomplexobj(signal) and self.dtype.kind != "c":
+            raise ValueError(f"A complex signal needs a complex dtype, got {self.dtype}")
+
+    def add(self, signal, snr=20, signal_power=None, inplace=False):
+        """Add noise to a signal at a given SNR.
+
+        Args:
+            signal (ndarray): real or complex samples (complex noise for a complex signal)
+            snr (float, optional): SNR in dB. Defaults to 20.
+            signal_power (float, optional): power of the signal. Defaults to None (mean of |signal|**2).
+            inplace (bool, optional): add the noise to signal itself (it must be a contiguous array of dtype self.dtype). Defaults to False.
+
+        Returns:
+            ndarray: the noisy signal (dtype self.dtype)
+        """
+        self._check(signal)
+        if signal_power is None:
+            signal_power = np.mean(np.abs(signal)**2)
+        if inplace:
+            out = signal
+            if out.dtype != self.dtype or not out.flags.c_contiguous:
+                raise ValueError(f"inplace needs a contiguous {self.dtype} signal, got {out.dtype}")
+            flat = out.reshape(-1)
+            buffer = np.empty(min(CHUNK_SIZE, flat.size), dtype=self.dtype)
+            power = noise_power(signal_power, snr)
+            for start in range(0, flat.size, CHUNK_SIZE):
+                chunk = flat[start:start + CHUNK_SIZE]
+                chunk += self.generate(chunk.size, power, out=buffer[:chunk.size])
+        else:
+            out = self.generate(np.shape(signal), noise_power(signal_power, snr))
+            out += signal
+        return out
+
+    def sweep(self, signal, snr, signal_power=None, out=None):
+        """Noisy copies of one signal, one per SNR, drawn in one call.
+
+        Args:
+            signal (ndarray): 1-D real or complex samples
+            snr (ndarray): SNRs in dB
+            signal_power (float, optional): power of the signal. Defaults to None (mean of |signal|**2).
+            out (ndarray, optional): contiguous output array (len(snr), signal.size) of dtype self.dtype. Defaults to None.
+
+        Returns:
+            ndarray: row k is signal + noise at snr[k]
+        """
+        signal = np.ravel(signal)
+        snr = np.atleast_1d(snr)
+        self._check(signal)
+        if signal_power is None:
+            signal_power = np.mean(np.abs(signal)**2)
+        out = self.generate((snr.size, signal.size), out=out)
+        out *= np.sqrt(noise_power(signal_power, snr)).astype(out.real.dtype)[:, None]
+        out += signal
+        return out
@@ -0,0 +1,191 @@
+# Conversions between the 16 bits samples and the 32 bits words of the DAC/ADC memories
+#
+# Formats (little endian, like the ARM of the ZCU111) :
+#   - Real : 2 samples per int32, the first sample in the low 16 bits (see data.concat)
+#   - IQ   : 1 complex sample per int32, I in the high 16 bits and Q in the low 16 bits
+# An int32 array is seen as int16 pairs with ndarray.view, so most of the conversions do not copy.
+
+import sys
+import numpy as np
+
+if sys.byteorder != "little":
+    raise ImportError("packing.py expects a little endian machine (the 16 bits halves are read with views)")
+
+# Number of samples converted at once by complex_to_int32 (limits the temporary memory)
+CHUNK_SIZE = 1 << 20
+
+INT16_MIN = -2**15
+INT16_MAX = 2**15 - 1
+
+
+def _int16_array(array):
+    """ Contiguous int16 array, without copy if array is already one (other integers are wrapped on 16 bits) """
+    array = np.asarray(array)
+    if array.dtype != np.int16:
+        array = array.astype(np.int16)
+    return np.ascontiguousarray(array)
+
+
+def int16_to_int32(array16, out=None):
+    """Pack pairs of int16 samples into int32 words (sample 2n in the low 16 bits, sample 2n+1 in the high 16 bits).
+
+    Args:
+        array16 (ndarray): int16 samples, a last odd sample is dropped
+        out (ndarray, optional): int32 output array. Defaults to None (a view of array16 when it is a contiguous int16 array).
+
+    Returns:
+        ndarray: array16.size // 2 int32 words
+    """
+    array16 = _int16_array(array16)
+    words = array16[:array16.size // 2 * 2].view(np.int32)
+    if out is None:
+        return words
+    out[...] = words
+    return out
+
+
+def int32_to_int16(array32):
+    """Unpack int32 (or uint32) words into int16 samples, the inverse of int16_to_int32.
+
+    Args:
+        array32 (ndarray): 32 bits words
+
+    Returns:
+        ndarray: 2 * array32.size int16 samples (a view of array32 when it is contiguous)
+    """
+    return np.ascontiguousarray(array32).view(np.int16)
+
+
+def IQ_to_int32(I, Q, out=None):
+    """Pack int16 I and Q samples into int32 words (I in the high 16 bits, Q in the low 16 bits).
+
+    Args:
+        I (ndarray): int16 in-phase samples
+        Q (ndarray): int16 quadrature samples, same size as I
+        out (ndarray, optional): int32 output array. Defaults to None.
+
+    Returns:
+        ndarray: I.size int32 words
+    """
+    if (np.size(I) != np.size(Q)):
+        raise ValueError("I and Q must have the same size")
+    if out is None:
+        out = np.empty(np.size(I), dtype=np.int32)
+    pairs = out.view(np.int16).reshape(-1, 2)
+    pairs[:, 0] = Q
+    pairs[:, 1] = I
+    return out
+
+
+def int32_to_IQ(array32):
+    """Unpack int32 (or uint32) words into int16 I and Q samples, the inverse of IQ_to_int32.
+
+    Args:
+        array32 (ndarray): 32 bits words
+
+    Returns:
+        tuple: (I, Q) int16 strided views of array32 (when it is contiguous)
+    """
+    pairs = int32_to_int16(array32).reshape(-1, 2)
+    return pairs[:, 1], pairs[:, 0]
+
+
+def complex_to_int32(complex_array, scale=1.0, out=None, saturate=True):
+    """Convert complex samples into int32 IQ words (I in the high 16 bits, Q in the low 16 bits).
+
+    The samples are multiplied by scale, rounded to the nearest integer and saturated to the int16 range.
+    The conversion is done by chunks, out can share the memory of a complex64 input to convert it in place :
+        words = complex_to_int32(x, out=x.view(np.int32)[:x.size])
+
+    Args:
+        complex_array (ndarray): complex64, complex128 (or real, then Q = 0) samples
+        scale (float, optional): factor applied before the rounding. Defaults to 1.0.
+        out (ndarray, optional): int32 output array. Defaults to None.
+        saturate (bool, optional): clip to [-32768, 32767], else the values are wrapped on 16 bits. Defaults to True.
+
+    Returns:
+        ndarray: complex_array.size int32 words
+    """
+    complex_array = np.ravel(complex_array)
+    N = complex_array.size
+    if out is None:
+        out = np.empty(N, dtype=np.int32)
+    elif (out.size != N):
+        raise ValueError(f"out must have {N} elements, got {out.size}")
+    pairs = out.view(np.int16).reshape(-1, 2)
+
+    if np.iscomplexobj(complex_array):
+        # [real, imag] pairs without copy, reversed to get [Q, I]
+        components = np.ascontiguousarray(complex_array).view(complex_array.real.dtype).reshape(-1, 2)[:, ::-1]
+    else:
+        components = None
+
+    for start in range(0, N, CHUNK_SIZE):
+        stop = min(start + CHUNK_SIZE, N)
+        if components is not None:
+            chunk = components[start:stop] * scale
+        else:
+            chunk = np.zeros((stop - start, 2))
+            chunk[:, 1] = complex_array[start:stop] * scale
+        _store_int16(pairs[start:stop], chunk, saturate)
+    return out
+
+
+def _store_int16(destination, values, saturate):
+    """ Round values (modified in place) to the nearest integer and store them in the int16 array destination """
+    np.rint(values, out=values)
+    if saturate:
+        np.clip(values, INT16_MIN, INT16_MAX, out=values)
+        destination[...] = values
+    else:
+        destination[...] = values.astype(np.int64)
+
+
+def float_IQ_to_int32(I, Q, scale=1.0, out=None, saturate=True):
+    """Convert real I and Q samples (e.g. filtered separately) into int32 IQ words, like complex_to_int32.
+
+    Args:
+        I (ndarray): float in-phase samples
+        Q (ndarray): float quadrature samples, same size as I
+        scale (float, optional): factor applied before the rounding. Defaults to 1.0.
+        out (ndarray, optional): int32 output array. Defaults to None.
+        saturate (bool, optional): clip to [-32768, 32767], else the values are wrapped on 16 bits. Defaults to True.
+
+    Returns:
+        ndarray: I.size int32 words
+    """
+    if (np.size(I) != np.size(Q)):
+        raise ValueError("I and Q must have the same size")
+    N = np.size(I)
+    if out is None:
+        out = np.empty(N, dtype=np.int32)
+    elif (out.size != N):
+        raise ValueError(f"out must have {N} elements, got {out.size}")
+    pairs = out.view(np.int16).reshape(-1, 2)
+    for start in range(0, N, CHUNK_SIZE):
+        stop = min(start + CHUNK_SIZE, N)
+        _store_int16(pairs[start:stop, 1], np.multiply(I[start:stop], scale, dtype=np.float64), saturate)
+        _store_int16(pairs[start:stop, 0], np.multiply(Q[start:stop], scale, dtype=np.float64), saturate)
+    return out
+
+
+def int32_to_complex(array32, scale=1.0, dtype=np.complex64, out=None):
+    """Convert int32 IQ words into complex samples, the inverse of complex_to_int32.
+
+    Args:
+        array32 (ndarray): 32 bits IQ words
+        scale (float, optional): the samples are divided by scale. Defaults to 1.0.
+        dtype (dtype, optional): complex64 or complex128. Defaults to np.complex64.
+        out (ndarray, optional): complex output array. Defaults to None.
+
+    Returns:
+        ndarray: array32.size complex samples
+    """
+    I, Q = int32_to_IQ(array32)
+    if out is None:
+        out = np.empty(I.size, dtype=dtype)
+    out.real = I
+    out.imag = Q
+    if (scale != 1.0):
+        out /= scale
+    return out
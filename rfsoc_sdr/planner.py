@@ -0,0 +1,195 @@
+# Length of a waveform looped by a DAC memory, and fitting of a waveform to the memory of a DAC
+#
+# A DAC plays its memory in a loop : the waveform is seamless if every tone has an integer number of periods in it,
+# and its number of 32 bits samples must be a multiple of the granularity of the memory (the width of the memory
+# interface in 32 bits samples : 32 for BRAM/URAM, 16 for DDR4, see SdrOverlay.check_data_width).
+# The lengths are computed with exact fractions (f / Fs) : the shortest seamless loop is the lcm of the
+# denominators and of the granularity, no search. When it does not fit, several tones need a search of the length
+# with the smallest frequency error, limited to the SEARCH_LIMIT shortest lengths.
+
+from fractions import Fraction
+from math import lcm, gcd
+
+import numpy as np
+
+# Granularity of the memories in 32 bits samples
+BRAM_GRANULARITY = 32
+DDR4_GRANULARITY = 16
+
+# Size in bytes of the memories of the design, by base address (an MMIO window of the design can be bigger than its memory)
+MEMORY_SIZES = {
+    0xA000_0000: 1 << 20,       # BRAM(0) 1M, DAC 00
+    0xA010_0000: 1 << 20,       # BRAM(1) 1M, DAC 01
+    0xA120_0000: 512 << 10,     # URAM(1) 512k, DAC 02
+    0x4_0000_0000: 4 << 30,     # DDR4(0), 4G window, DAC 12
+    0xA100_0000: 2 << 20,       # URAM(0) 2M, DAC 13
+    0xA020_0000: 1 << 20,       # BRAM(0) 1M, ADC 00
+}
+
+# Number of loop lengths compared at once when there are several tones
+CHUNK_SIZE = 1 << 16
+
+# Maximum number of loop lengths searched when there are several tones (m * granularity 32 bits samples, m <= 64k)
+SEARCH_LIMIT = 1 << 16
+
+# f / Fs closer than this to a fraction of small denominator is that fraction (float rounding, e.g. f = Fs / 3)
+RATIO_TOLERANCE = 1e-12
+
+
+def _ratio(f, Fs, max_denominator):
+    """ f / Fs as a fraction """
+    exact = Fraction(f) / Fraction(Fs)
+    simple = exact.limit_denominator(max_denominator)
+    return simple if abs(simple - exact) <= RATIO_TOLERANCE else exact
+
+
+def _periods(r, N):
+    """ Number of periods of the tone f / Fs = r in N samples, at least one (the tone must not become DC) """
+    periods = round(r * N)
+    if (periods == 0 and r != 0):
+        return 1 if r > 0 else -1
+    return periods
+
+
+def _error(ratios, N):
+    """ Largest frequency error of the tones (in units of Fs) for a loop of N samples """
+    return max(abs(Fraction(_periods(r, N), N) - r) for r in ratios)
+
+
+def _best_length(ratios, step, max_m, tolerance=0):
+    """m <= max_m of a loop of m * step samples : the shortest one with a frequency error (in units of Fs) up to
+    tolerance, else the one with the smallest error (the largest error of the tones)."""
+    if (len(ratios) == 1):
+        # Best rational approximations of r * step with denominators up to max_m, by powers of 2 (and the longest
+        # loop, at least one period for a tone slower than Fs / (2 * max_m * step))
+        r = ratios[0]
+        candidates = sorted({(r * step).limit_denominator(min(1 << k, max_m)).denominator
+                             for k in range(max_m.bit_length() + 1)} | {max_m})
+        for m in candidates:
+            if (_error(ratios, m * step) <= tolerance):
+                return m
+        return min(candidates, key=lambda m: _error(ratios, m * step))
+    # No closed form for several tones : the SEARCH_LIMIT shortest lengths are compared (float64, by chunks)
+    best_m, best_error = 1, np.inf
+    r = np.array([float(r) for r in ratios])[:, None]
+    last = min(max_m, SEARCH_LIMIT)
+    for start in range(1, last + 1, CHUNK_SIZE):
+        N = np.arange(start, min(start + CHUNK_SIZE, last + 1), dtype=np.float64) * step
+        periods = np.rint(r * N)
+        periods = np.where((periods == 0) & (r != 0), np.sign(r), periods)
+        error = np.max(np.abs(periods - r * N), axis=0) / N
+        within = np.flatnonzero(error <= float(tolerance))
+        if (within.size > 0):
+            return start + int(within[0])
+        i = np.argmin(error)
+        if (error[i] < best_error):
+            best_m, best_error = start + int(i), error[i]
+    return best_m
+
+
+def plan_loop(frequencies, Fs, granularity=BRAM_GRANULARITY, capacity=None, samples_per_word=2, opt="min", max_error=0):
+    """Number of samples of a seamless loop of one or several tones.
+
+    When no length up to capacity gives an integer number of periods to all the tones, the shortest length with a
+    frequency error up to max_error is returned, else the one giving the smallest error (the tones are then moved to
+    the nearest k * Fs / N, like data.sin_gen does). With several tones only the SEARCH_LIMIT shortest lengths are
+    searched.
+
+    Args:
+        frequencies (float or list): frequencies of the tones (same unit as Fs, negative in IQ mode)
+        Fs (float): sampling rate of the DAC
+        granularity (int, optional): the number of 32 bits samples must be a multiple of it (BRAM_GRANULARITY or DDR4_GRANULARITY). Defaults to BRAM_GRANULARITY.
+        capacity (int, optional): maximum number of 32 bits samples (size of the memory). Defaults to None (no limit, opt="min" only).
+        samples_per_word (int, optional): 2 in Real mode (2 samples of 16 bits per 32 bits sample), 1 in IQ mode. Defaults to 2.
+        opt (str, optional): "min" the shortest loop, "max" the longest one that fits in capacity. Defaults to "min".
+        max_error (float, optional): frequency error accepted for an inexact loop (same unit as Fs). Defaults to 0 (the smallest error).
+
+    Returns:
+        dict: "number_of_samples" (N, for data.sin_gen), "number_of_32bits_samples", "periods" of each tone,
+            "frequencies" achieved (periods * Fs / N), "error" (achieved - wanted) and "exact" (all the errors are 0)
+    """
+    if opt not in ("min", "max"):
+        raise ValueError("opt is 'min' or 'max'")
+    if (capacity is None and opt == "max"):
+        raise ValueError("opt = 'max' needs the capacity of the memory")
+    frequencies = [float(f) for f in np.atleast_1d(frequencies)]
+    ratios = [_ratio(f, Fs, 1 << 32 if capacity is None else capacity * samples_per_word) for f in frequencies]
+    step = granularity * samples_per_word
+    # Shortest exact loop : a multiple of every denominator and of the granularity
+    period = lcm(step, *[r.denominator for r in ratios])
+
+    tolerance = Fraction(max_error) / Fraction(Fs)
+    exact = capacity is None or period <= capacity * samples_per_word
+    # Inexact loop of m * step samples : when the exact one does not fit, or shorter than it within max_error
+    m = None
+    if not exact:
+        max_m = capacity // granularity
+        if (max_m == 0):
+            raise ValueError(f"The capacity ({capacity}) is smaller than the granularity ({granularity})")
+        m = _best_length(ratios, step, max_m, tolerance)
+    elif (tolerance > 0 and period > step):
+        max_m = period // step - 1
+        if capacity is not None:
+            max_m = min(max_m, capacity // granularity)
+        m = _best_length(ratios, step, max_m, tolerance)
+        if (_error(ratios, m * step) > tolerance):
+            m = None
+
+    if m is None:
+        N = period
+        if (opt == "max"):
+            N = capacity * samples_per_word // period * period
+    else:
+        exact = False
+        if (opt == "max"):
+            m = capacity // granularity // m * m
+        N = m * step
+
+    periods = [_periods(r, N) for r in ratios]
+    achieved = [p * Fs / N for p in periods]
+    return {
+        "number_of_samples": N,
+        "number_of_32bits_samples": N // samples_per_word,
+        "periods": periods,
+        "frequencies": achieved,
+        "error": [a - f for a, f in zip(achieved, frequencies)],
+        "exact": exact,
+    }
+
+
+FITS = ["warn", "tile", "pad", "raise"]
+
+
+def fit_to_memory(data, granularity, capacity, fit="tile"):
+    """Make a waveform loadable in a memory : a multiple of granularity 32 bits samples, at most capacity.
+
+    Args:
+        data (ndarray int32): the waveform
+        granularity (int): the number of 32 bits samples must be a multiple of it (BRAM_GRANULARITY or DDR4_GRANULARITY)
+        capacity (int): number of 32 bits samples of the memory
+        fit (str, optional): what to do with a size that is not a multiple of granularity :
+            "tile" repeat the waveform until it is (the loop stays seamless, at most granularity times),
+            "pad" add zeros at the end, "raise" raise a ValueError, "warn" print a warning and keep it. Defaults to "tile".
+
+    Returns:
+        ndarray: data itself if its size is already valid, else the tiled or padded copy
+    """
+    if fit not in FITS:
+        raise ValueError(f"fit must be one of {FITS}")
+    size = data.size
+    if (size == 0):
+        raise ValueError("The waveform is empty")
+    if (size % granularity != 0):
+        if (fit == "raise"):
+            raise ValueError(f"The signal must have a number of 32-bit samples multiple of {granularity}, got {size}")
+        elif (fit == "warn"):
+            print(f"WARNING : The signal must have a number of 32-bit samples multiple of {granularity}, got {size}")
+        elif (fit == "tile"):
+            data = np.tile(data, granularity // gcd(size, granularity))
+        else:
+            padded = np.zeros(-(-size // granularity) * granularity, dtype=data.dtype)
+            padded[:size] = data
+            data = padded
+    if (data.size > capacity):
+        raise ValueError(f"The signal ({data.size} 32 bits samples) does not fit in the memory ({capacity} 32 bits samples)")
+    return data
@@ -0,0 +1,190 @@
+# M-QAM receiver for a batch of captures (e.g. the loopback of a QamTx waveform)
+#
+# All the captures of the batch are processed together (2-D arrays, one row per capture) :
+#   matched filter (RRC) -> timing by correlation with a known preamble -> gain and phase correction (least squares)
+#   -> decisions -> EVM, SER and BER per capture and for the whole batch
+# The captures must have samples_per_symbol samples per symbol (see dsp.resample_to_rate otherwise) and each one must
+# contain the preamble : a capture whose normalized correlation peak is below the threshold is not locked, its
+# metrics are NaN and it is left out of the totals.
+
+import numpy as np
+from scipy.signal import oaconvolve
+from scipy.fft import fft, ifft, next_fast_len
+
+
+class QamRx:
+    """Data-aided M-QAM receiver : the symbols sent (reference) are known, like in a loopback test.
+
+    Example:
+        tx = QamTx(mod_order=16, samples_per_symbol=4)
+        indices = tx.random_indices(4096)
+        sdr.load_data(0, 0, tx.modulate(indices))
+        rx = QamRx(tx, indices)
+        frames = np.stack([sdr.get_data(4096) for _ in range(1000)])
+        result = rx.demodulate(frames)
+        print(result["evm_total"], result["ser_total"], result["ber_total"])
+    """
+
+    def __init__(self, tx, reference, preamble_length=None, cyclic=True, guard=None, threshold=0.5):
+        """
+        Args:
+            tx (QamTx): transmitter of the waveform (constellation, RRC filter and samples per symbol)
+            reference (ndarray): symbol indices sent, the preamble is the beginning of it
+            preamble_length (int, optional): number of symbols of the preamble, the known symbols correlated with
+                the captures to find the timing. Defaults to None (all the reference).
+            cyclic (bool, optional): the waveform loops in the DAC memory, the symbols before and after the
+                reference are the end and the beginning of it. Defaults to True.
+            guard (int, optional): number of symbols ignored at each end of a capture (transient of the
+                matched filter). Defaults to None (filter_span).
+            threshold (float, optional): minimum normalized correlation peak (0 to 1) of a locked capture. Defaults to 0.5.
+        """
+        self.tx = tx
+        self.reference = np.asarray(reference)
+        self.samples_per_symbol = tx.samples_per_symbol
+        self.matched = np.conj(tx.rrc_filter[::-1])
+        self.cyclic = cyclic
+        self.guard = tx.filter_span if guard is None else guard
+        self.threshold = threshold
+
+        self.preamble = tx.symbols(self.reference[:preamble_length])
+        self.bits_per_symbol = int(np.log2(tx.mod_order))
+        # Number of bits set for each symbol index (bit errors = ones in decided ^ sent)
+        self.ones = np.array([bin(i).count("1") for i in range(tx.mod_order)], dtype=np.uint8)
+
+    def matched_filter(self, frames):
+        """ RRC matched filter of each capture (2-D array, one row per capture), aligned like np.convolve "same" """
+        return oaconvolve(frames, self.matched[None, :], mode="same", axes=1)
+
+    def synchronize(self, filtered):
+        """Timing of each capture by correlation (FFT) of its symbols with the preamble, for each sample phase.
+
+        With cyclic=True the symbols of a capture are folded modulo the reference length before the correlation :
+        the capture can start anywhere in the waveform and a capture longer than the waveform adds its periods.
+        Each capture must contain the preamble : without it the arg-max is a wrong timing, its normalized peak
+        (|correlation| / (norm of the preamble * norm of the symbols under it), 1 for a perfect match) is low.
+
+        Args:
+            filtered (ndarray): matched filter output, one row per capture
+
+        Returns:
+            tuple: (phase, offset, peak) the sample phase of the symbols (0 to samples_per_symbol - 1), the symbol of
+                the capture where the reference starts (symbol j of the capture is the reference symbol j - offset)
+                and the normalized correlation peak of each capture
+        """
+        L = self.samples_per_symbol
+        N = self.reference.size
+        number_of_frames, n = filtered.shape
+        J = n // L
+        if (J <= 2 * self.guard):
+            raise ValueError(f"The captures must have more than {2 * self.guard} symbols")
+        # (capture, phase, symbol), without the transient of the matched filter
+        symbols = filtered[:, :J * L].reshape(number_of_frames, J, L).transpose(0, 2, 1).copy()
+        symbols[:, :, :self.guard] = 0
+        symbols[:, :, J - self.guard:] = 0
+
+        if self.cyclic:
+            size = N
+            folded = np.zeros((number_of_frames, L, -(-J // N) * N), dtype=symbols.dtype)
+            folded[:, :, :J] = symbols
+            symbols = folded.reshape(number_of_frames, L, -1, N).sum(axis=2)
+        else:
+            size = next_fast_len(J + self.preamble.size)
+        correlation = ifft(fft(symbols, size, axis=2) * np.conj(fft(self.preamble, size)), axis=2)
+
+        correlation = np.abs(correlation).reshape(number_of_frames, -1)
+        index = correlation.argmax(axis=1)
+        phase, offset = np.divmod(index, size)
+
+        # Energy of the symbols under the preamble at the peak
+        rows = np.arange(number_of_frames)[:, None]
+        window = (offset[:, None] + np.arange(self.preamble.size)[None, :]) % size
+        padded = np.zeros((number_of_frames, size), dtype=symbols.dtype)
+        padded[:, :min(size, symbols.shape[2])] = symbols[np.arange(number_of_frames), phase, :size]
+        energy = np.sum(np.abs(padded[rows, window])**2, axis=1) * np.sum(np.abs(self.preamble)**2)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            peak = np.nan_to_num(correlation[np.arange(number_of_frames), index] / np.sqrt(energy))
+
+        if not self.cyclic:
+            # Negative offsets (the reference started before the capture) are at the end
+            offset = np.where(offset >= J, offset - size, offset)
+        return phase, offset, peak
+
+    def decide(self, symbols):
+        """ Index of the nearest constellation point (Gray mapping of QamTx) """
+        side = int(np.sqrt(self.tx.mod_order))
+        bits_per_axis = self.bits_per_symbol // 2
+        levels = []
+        for component in (symbols.real, symbols.imag):
+            level = np.clip(np.rint((component + side - 1) / 2), 0, side - 1).astype(np.int64)
+            levels.append(level ^ (level >> 1))
+        return (levels[0] << bits_per_axis) | levels[1]
+
+    def demodulate(self, frames):
+        """Matched filter, timing, gain and phase correction and metrics of a batch of captures.
+
+        Args:
+            frames (ndarray or list): complex captures (same size), one row per capture (e.g. SdrOverlay.get_data)
+
+        Returns:
+            dict: per capture arrays "phase", "offset", "peak" (see synchronize), "locked" (peak >= threshold),
+                "gain", "evm" (%), "ser", "ber", "symbols" (corrected symbols, NaN outside the capture) and "evm_total",
+                "ser_total", "ber_total" for the locked captures of the batch (the metrics of the others are NaN)
+        """
+        frames = np.atleast_2d(np.asarray(frames))
+        L = self.samples_per_symbol
+        N = self.reference.size
+        number_of_frames, n = frames.shape
+
+        filtered = self.matched_filter(frames)
+        phase, offset, peak = self.synchronize(filtered)
+        locked = peak >= self.threshold
+        if not locked.all():
+            print(f"WARNING : {np.count_nonzero(~locked)} / {number_of_frames} captures without the preamble "
+                  f"(correlation peak below {self.threshold}), left out of the metrics")
+
+        # Symbol j of a capture is the sample phase + j * L, it is the reference symbol (j - offset)
+        j = np.arange(n // L)
+        positions = phase[:, None] + L * j[None, :]
+        valid = (positions >= self.guard * L) & (positions < n - self.guard * L)
+        sent = j[None, :] - offset[:, None]
+        if self.cyclic:
+            sent %= N
+        else:
+            valid &= (sent >= 0) & (sent < N)
+        valid &= locked[:, None]
+        positions = np.minimum(positions, n - 1)
+        sent = np.clip(sent, 0, N - 1)
+
+        rows = np.arange(number_of_frames)[:, None]
+        symbols = filtered[rows, positions]
+        sent = self.reference[sent]
+        ideal = self.tx.symbols(sent)
+
+        # Least squares complex gain (amplitude and carrier phase) of each capture (NaN if not locked)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            gain = np.where(valid, np.conj(ideal) * symbols, 0).sum(axis=1) / np.where(valid, np.abs(ideal)**2, 0).sum(axis=1)
+            symbols = symbols / gain[:, None]
+        symbols[~valid] = np.nan
+
+        count = valid.sum(axis=1)
+        error_power = np.where(valid, np.abs(symbols - ideal)**2, 0).sum(axis=1)
+        signal_power = np.where(valid, np.abs(ideal)**2, 0).sum(axis=1)
+        decided = self.decide(np.where(valid, symbols, 0))
+        symbol_errors = ((decided != sent) & valid).sum(axis=1)
+        bit_errors = np.where(valid, self.ones[decided ^ sent], 0).sum(axis=1)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return {
+                "phase": phase,
+                "offset": offset,
+                "peak": peak,
+                "locked": locked,
+                "gain": gain,
+                "symbols": symbols,
+                "evm": 100 * np.sqrt(error_power / signal_power),
+                "ser": symbol_errors / count,
+                "ber": bit_errors / (count * self.bits_per_symbol),
+                "evm_total": 100 * np.sqrt(error_power.sum() / signal_power.sum()),
+                "ser_total": symbol_errors.sum() / count.sum(),
+                "ber_total": bit_errors.sum() / (count.sum() * self.bits_per_symbol),
+            }
@@ -1,12 +1,22 @@
-from pynq import Overlay
-from pynq import MMIO
-import xrfclk
-import xrfdc
+# PYNQ (or the simulated board, see backend.py)
+from backend import Overlay, MMIO, xrfclk, xrfdc
 import numpy as np
-from time import sleep
-
-from dc import dac_bram_write, ddr4_write, set_bram_dac_counter, set_uram_dac_counter, set_ddr4_controller, adc_bram_read_IQ, adc_bram_read
+from time import sleep, perf_counter
+from collections import deque
+import threading
+import queue
+import hashlib
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from dc import dac_bram_write_bulk, ddr4_write_stream, set_bram_dac_counter, set_uram_dac_counter, set_ddr4_controller, adc_bram_read_IQ, adc_bram_read_real
 from data import sin_gen
+from waveform import read_waveform
+from dsp import resample_to_rate
+from planner import plan_loop, fit_to_memory, BRAM_GRANULARITY, DDR4_GRANULARITY, MEMORY_SIZES
+from transaction import RfdcTransaction
+from shadow import RfdcShadow
 
 class SdrOverlay(Overlay):
     """The only class (Overlay subclass) in this project, it provides the interface between the design (overlay).
@@ -29,7 +39,10 @@ class SdrOverlay(Overlay):
         print("Design loaded (status) : ", self.is_loaded())
 
         # For better readability, 'rfdc' can be used to configure converters
-        self.rfdc = self.usp_rf_data_converter_0
+        # The settings written are kept in a shadow copy : rewriting a value already set does nothing (see resync)
+        self.rfdc = RfdcShadow(self.usp_rf_data_converter_0)
+        # RfdcTransaction in use inside a configure() block (self.rfdc is then the transaction)
+        self._transaction = None
 
         xrfclk.set_ref_clks()
         self.ref_clock = 409.6 # 409 MHz clock reference for the rfdc PLLs (see the def print_lmx_lmk() function in dc.py)
@@ -63,6 +76,16 @@ class SdrOverlay(Overlay):
         self.rfdc.dac_tiles[1].DynamicPLLConfig(1, self.ref_clock, Fs_dac_tile_1)
         self.rfdc.adc_tiles[0].DynamicPLLConfig(1, self.ref_clock, Fs_adc_tile_0)
 
+        # DAC tiles sampling rate (MHz) and interpolation, the samples in memory are played at dac_fs / dac_interpolation
+        self.dac_fs = [Fs_dac_tile_0, Fs_dac_tile_1]
+        self.dac_interpolation = [2, 2]
+
+        # ADC sampling rate (MHz) and decimation, needed to know how long a capture takes
+        self.adc_fs = Fs_adc_tile_0
+        self.adc_decimation = 2
+        # Latency (s) of the last captures, see adc_capture
+        self.capture_latencies = deque(maxlen=1000)
+
         ## WARNING : By default, the configuration is set to arbitrary values. Always start by setting the DAC to the values you need!
 
         # DACs
@@ -109,15 +132,26 @@ class SdrOverlay(Overlay):
 
         ## MMIO init ##
         # Each memory associated with a DAC is named by mem_xx where xx is the DAC number
-        self.dac_mem_00 = MMIO(0xA000_0000, 0x000F_FFFF)   # BRAM(0) 1M
-        self.dac_mem_01 = MMIO(0xA010_0000, 0x000F_FFFF)   # BRAM(1) 1M
-        self.dac_mem_02 = MMIO(0xA120_0000, 0x007F_FFFF)   # URAM(1) 512k
+        # The lengths are the sizes of the memories (see planner.MEMORY_SIZES), not of the address windows
+        self.dac_mem_00 = MMIO(0xA000_0000, 0x0010_0000)   # BRAM(0) 1M
+        self.dac_mem_01 = MMIO(0xA010_0000, 0x0010_0000)   # BRAM(1) 1M
+        self.dac_mem_02 = MMIO(0xA120_0000, 0x0008_0000)   # URAM(1) 512k
         # self.dac_mem_10 = MMIO(0xA020_0000, 0x000F_FFFF)   # BRAM(2) 1M
         # self.dac_mem_11 = MMIO(0xA128_0000, 0x0007_FFFF)   # BRAM(3) 512K
-        self.dac_mem_12 = MMIO(0x4_0000_0000, 0xFFFF_FFFF)  # DDR4(0) 8G
-        self.dac_mem_13 = MMIO(0xA100_0000, 0x001F_FFFF)   # URAM(0) 2M
-        self.adc_mem_00 = MMIO(0xA020_0000, 0x000F_FFFF) # BRAM(0) 1M
-
+        self.dac_mem_12 = MMIO(0x4_0000_0000, 0x1_0000_0000)  # DDR4(0) 4G window
+        self.dac_mem_13 = MMIO(0xA100_0000, 0x0020_0000)   # URAM(0) 2M
+        self.adc_mem_00 = MMIO(0xA020_0000, 0x0010_0000) # BRAM(0) 1M
+
+        # Memory of each DAC : (name, mmio, granularity, capacity) in 32 bits samples
+        self.dac_memories = {
+            (0, 0): ("BRAM(0)", self.dac_mem_00, BRAM_GRANULARITY, MEMORY_SIZES[0xA000_0000] // 4),
+            (0, 1): ("BRAM(1)", self.dac_mem_01, BRAM_GRANULARITY, MEMORY_SIZES[0xA010_0000] // 4),
+            (0, 2): ("URAM(1)", self.dac_mem_02, BRAM_GRANULARITY, MEMORY_SIZES[0xA120_0000] // 4),
+            (1, 2): ("DDR4(0)", self.dac_mem_12, DDR4_GRANULARITY, MEMORY_SIZES[0x4_0000_0000] // 4),
+            (1, 3): ("URAM(0)", self.dac_mem_13, BRAM_GRANULARITY, MEMORY_SIZES[0xA100_0000] // 4),
+        }
+        # Number of 32 bits samples of the waveform loaded in each DAC memory (see memory_utilization)
+        self._dac_loaded = {}
 
         self.dac_controller_00 = self.bram_dac_driver.bram_dac_driver_0.bram_counter_0
         self.dac_controller_01 = self.bram_dac_driver.bram_dac_driver_1.bram_counter_0
@@ -128,69 +162,388 @@ class SdrOverlay(Overlay):
         self.dac_controller_13 = self.uram_dac_driver.uram_dac_driver_1.bram_counter_2_0
         self.adc_controller_00 = self.bram_adc_capture.adc_counter_v1_0_0
 
+        # Hashes of the blocks resident in each DAC memory (see load_data), cache_block_size is a multiple of 32 and 16
+        self.cache_block_size = 64 * 1024
+        self._dac_cache = {}
+        # One lock per DAC : load_data/set_dac_controller can be called from several threads for different DACs (see load_all)
+        self._dac_locks = {(0, dac): threading.RLock() for dac in self.dacs_tile0}
+        self._dac_locks.update({(1, dac): threading.RLock() for dac in self.dacs_tile1})
+        # The capture BRAM is shared : adc_capture/get_data wait for the capture in progress (e.g. of capture_stream)
+        self._capture_lock = threading.RLock()
+
         
 
 ########### Driver and Capture ##################
 
-    def load_data(self, tile, dac, data):
+    def load_data(self, tile, dac, data, cache = True, fit = "tile"):
         """Written to the memory associated with a specific DAC numbered by its tile number and its number in that tile.
 
+        The memory content is tracked by a hash per block of cache_block_size 32 bits samples : reloading the same
+        waveform writes nothing and a modified waveform only rewrites the blocks that changed.
+        Call invalidate_cache if the memory was modified by something else (hardware reset, new bitstream, ...).
+
         Args:
             tile (int)
             dac (int)
             data (numpy.ndarray int32): array numpy already formatted in the correct int32 format
+            cache (bool, optional): False rewrites the whole memory. Defaults to True.
+            fit (str, optional): "tile", "pad", "raise" or "warn" when the size is not a multiple of the granularity of
+                the memory (see planner.fit_to_memory), a waveform bigger than the memory always raises a ValueError.
+                "warn" loads it as is (the loop glitches). The size loaded is given by loaded_size. Defaults to "tile".
+
+        Returns:
+            int: the number of 32 bits samples written
         """
         self._check_if_dac_is_valid(tile, dac)
-        self.check_data_width(tile, dac, data.size)
+        with self._dac_locks[(tile, dac)]:
+            return self._load_data(tile, dac, data, cache, fit)
+
+    def fit_data(self, tile, dac, data, fit = "tile"):
+        """ data tiled, padded or checked for the memory of a DAC (see planner.fit_to_memory), nothing is written """
+        self._check_if_dac_is_valid(tile, dac)
+        _, _, granularity, capacity = self.dac_memories[(tile, dac)]
+        return fit_to_memory(data, granularity, capacity, fit)
+
+    def loaded_size(self, tile, dac):
+        """ Number of 32 bits samples of the last waveform loaded by load_data in a DAC memory (0 if none) """
+        self._check_if_dac_is_valid(tile, dac)
+        return self._dac_loaded.get((tile, dac), 0)
+
+    def memory_utilization(self, verbose = True):
+        """Size of the waveform loaded in each DAC memory compared with the capacity of the memory.
+
+        Args:
+            verbose (bool, optional): print the table. Defaults to True.
+
+        Returns:
+            dict: {(tile, dac): {"memory", "loaded", "capacity", "granularity", "utilization"}} sizes in 32 bits samples, utilization in %
+        """
+        report = {}
+        for (tile, dac), (name, _, granularity, capacity) in self.dac_memories.items():
+            loaded = self._dac_loaded.get((tile, dac), 0)
+            report[(tile, dac)] = {
+                "memory": name,
+                "loaded": loaded,
+                "capacity": capacity,
+                "granularity": granularity,
+                "utilization": 100 * loaded / capacity,
+            }
+        if verbose:
+            print("Memory utilization :")
+            for (tile, dac), r in report.items():
+                print(f"\tDAC {tile}{dac} : {r['memory']:<8} {r['loaded']:>12} / {r['capacity']:<12} 32 bits samples ({r['utilization']:.2f} %)")
+        return report
+
+    def _load_data(self, tile, dac, data, cache, fit):
+        data = self.fit_data(tile, dac, data, fit)
         # The same function is used to fill bram and uram because of the IP AXI BRAM Controller
         if (tile == 0):
             if (dac == 0):
-                dac_bram_write(self.dac_mem_00, data)
+                mmio, write = self.dac_mem_00, dac_bram_write_bulk
             elif (dac == 1):
-                dac_bram_write(self.dac_mem_01, data)
+                mmio, write = self.dac_mem_01, dac_bram_write_bulk
             elif (dac == 2):
-                dac_bram_write(self.dac_mem_02, data)
+                mmio, write = self.dac_mem_02, dac_bram_write_bulk
             else:
                 raise ValueError("dac value is imposible")
         elif (tile == 1):
             # if (dac == 0):
-                # dac_bram_write(self.mem_10, data)
+                # mmio, write = self.mem_10, dac_bram_write_bulk
             # elif (dac == 1):
-                # dac_bram_write(self.mem_11, data)
+                # mmio, write = self.mem_11, dac_bram_write_bulk
             if (dac == 2):
-                ddr4_write(self.dac_mem_12, data)
+                mmio, write = self.dac_mem_12, partial(ddr4_write_stream, verbose=False)
             elif (dac == 3):
-                dac_bram_write(self.dac_mem_13, data)
+                mmio, write = self.dac_mem_13, dac_bram_write_bulk
             else:
                 raise ValueError("dac value is imposible")
         else:
             raise ValueError("tile value is imposible")
-    
-    def adc_capture(self, number_of_32bits_samples = 1024):
-        """ Start the capture of the adc (only ADC 00) output into BRAM """
-        counter_max = number_of_32bits_samples * (32/256) - 1
-        self.adc_controller_00.write(0x00, int(counter_max))
-        self.adc_controller_00.write(0x04, 0x0)
-        sleep(0.1)
-        self.adc_controller_00.write(0x04, 0x1)
-        sleep(0.1)
-
-    def get_data(self, number_of_32_bits_samples = 1024, mode="IQ"):
-        """ Read the data capture in BRAM """
+
+        block_size = self.cache_block_size
+        resident = self._dac_cache.get((tile, dac)) if cache else None
+        # The cache is only valid again once all the dirty blocks are written
+        self._dac_cache[(tile, dac)] = None
+        hashes = []
+        written = 0
+        for i, start in enumerate(range(0, data.size, block_size)):
+            block = np.ascontiguousarray(data[start:start + block_size]).astype(np.uint32, copy=False)
+            digest = hashlib.blake2b(block.data, digest_size=16).digest()
+            hashes.append(digest)
+            if resident is None or i >= len(resident) or resident[i] != digest:
+                write(mmio, block, word_offset=start)
+                written += block.size
+        self._dac_cache[(tile, dac)] = hashes
+        self._dac_loaded[(tile, dac)] = data.size
+        return written
+
+    def invalidate_cache(self, tile = None, dac = None):
+        """Forget what is resident in the DAC memories (all of them by default), the next load_data rewrites everything.
+
+        To be called after a hardware reset or when a memory is written without load_data.
+        """
+        if tile is None and dac is None:
+            self._dac_cache.clear()
+        else:
+            self._check_if_dac_is_valid(tile, dac)
+            self._dac_cache.pop((tile, dac), None)
+
+    def load_ddr4_stream(self, source, chunk_size = 1 << 20, verbose = True):
+        """Stream a waveform into the DDR4 of DAC 12 chunk by chunk, then set its controller with the total length.
+
+        Use it for waveforms bigger than the PS RAM (e.g. a np.memmap of a file), the memory usage is bounded by chunk_size.
+
+        Args:
+            source (numpy.ndarray or iterable): int32 waveform, np.memmap or any iterable of int32 blocks
+            chunk_size (int, optional): maximum number of 32 bits samples written at once. Defaults to 1M.
+            verbose (bool, optional): print the progress and the throughput. Defaults to True.
+
+        Returns:
+            int: the number of 32 bits samples loaded
+        """
+        with self._dac_locks[(1, 2)]:
+            self.invalidate_cache(1, 2)
+            number_of_32bits_samples = ddr4_write_stream(self.dac_mem_12, source, chunk_size = chunk_size, verbose = verbose)
+            self._dac_loaded[(1, 2)] = number_of_32bits_samples
+            self.set_dac_controller(1, 2, number_of_32bits_samples)
+        return number_of_32bits_samples
+
+    def load_all(self, waveforms, set_controller = True, verbose = True, fit = "tile"):
+        """Load several DACs in parallel (one thread per DAC), each DAC has its own memory and controller.
+
+        Example:
+            sdr.load_all({(0, 0): data, (0, 1): data, (1, 2): ddr4_data})
+
+        Args:
+            waveforms (dict): {(tile, dac): data} with data already formatted in the correct int32 format
+            set_controller (bool, optional): also set the controller of each DAC with the size loaded. Defaults to True.
+            verbose (bool, optional): print the elapsed time per DAC and in total. Defaults to True.
+            fit (str, optional): see load_data. Defaults to "tile".
+
+        Returns:
+            dict: elapsed time (s) per (tile, dac) and the total time with the key "total"
+        """
+        for tile, dac in waveforms:
+            self._check_if_dac_is_valid(tile, dac)
+
+        def load(tile, dac, data):
+            start = perf_counter()
+            with self._dac_locks[(tile, dac)]:
+                self.load_data(tile, dac, data, fit = fit)
+                if set_controller:
+                    self.set_dac_controller(tile, dac, self.loaded_size(tile, dac))
+            return perf_counter() - start
+
+        start = perf_counter()
+        with ThreadPoolExecutor(max_workers = max(len(waveforms), 1)) as executor:
+            futures = {key: executor.submit(load, key[0], key[1], data) for key, data in waveforms.items()}
+            elapsed = {key: future.result() for key, future in futures.items()}
+        elapsed["total"] = perf_counter() - start
+
+        if verbose:
+            for key, t in elapsed.items():
+                if key != "total":
+                    print(f"\tDAC {key[0]}{key[1]} : {t*1e3:.1f} ms")
+            print(f"\tTotal : {elapsed['total']*1e3:.1f} ms")
+        return elapsed
+
+    def load_file(self, file_name, tile = None, dac = None, set_controller = True, configure = False, check = True, fit = "tile"):
+        """Load a binary waveform file (see waveform.py) in a DAC memory.
+
+        The words are mapped from the file (np.memmap) and written block by block, the file is never read at once in RAM.
+
+        Args:
+            file_name (str): binary waveform file
+            tile (int, optional): Defaults to None (the tile of the header).
+            dac (int, optional): Defaults to None (the dac of the header).
+            set_controller (bool, optional): set the controller of the DAC with the number of 32 bits samples. Defaults to True.
+            configure (bool, optional): also apply the sampling rate, the mode, the NCO and the interpolation of the header to the tile. Defaults to False.
+            check (bool, optional): check the crc32 of the words before loading them. Defaults to True.
+            fit (str, optional): see load_data. Defaults to "tile".
+
+        Returns:
+            dict: the header of the file
+        """
+        data, header = read_waveform(file_name, mmap = True, check = check)
+        if tile is None:
+            tile = header["tile"]
+        if dac is None:
+            dac = header["dac"]
+        if tile is None or dac is None:
+            raise ValueError("The file has no target DAC, please give the tile and the dac")
+        self._check_if_dac_is_valid(tile, dac)
+
+        if configure:
+            if (header["Fs"] > 0):
+                self.set_dac_tile_pll(tile, Fs = header["Fs"])
+            if (header["mode"] == "IQ"):
+                self.set_dac_tile_IQ(tile, interpolation_factor = header["interpolation"] or 2, nco_freq = header["nco"])
+            else:
+                self.set_dac_tile_real(tile)
+
+        with self._dac_locks[(tile, dac)]:
+            self.load_data(tile, dac, data, fit = fit)
+            if set_controller:
+                self.set_dac_controller(tile, dac, self.loaded_size(tile, dac))
+        return header
+
+    def adc_capture(self, number_of_32bits_samples = 1024, timeout = 1.0):
+        """ Start the capture of the adc (only ADC 00) output into BRAM and return as soon as the BRAM is full
+
+        There is no fixed sleep : the fill time is computed from the number of 32 bits samples and the current ADC
+        sampling rate and decimation (one 32 bits sample every decimation/Fs seconds, in Real and in IQ mode).
+
+        Args:
+            number_of_32bits_samples (int, optional): size of the capture. Defaults to 1024.
+            timeout (float, optional): maximum capture time in s, a TimeoutError is raised if the capture needs more. Defaults to 1.0.
+
+        Returns:
+            float: latency of the capture in s (also recorded in self.capture_latencies)
+        """
+        fill_time = self.adc_fill_time(number_of_32bits_samples)
+        if fill_time > timeout:
+            raise TimeoutError(f"The capture needs {fill_time:.3f} s, more than the timeout ({timeout} s)")
+
+        with self._capture_lock:
+            start = perf_counter()
+            counter_max = number_of_32bits_samples * (32/256) - 1
+            self.adc_controller_00.write(0x00, int(counter_max))
+            self.adc_controller_00.write(0x04, 0x0)
+            self.adc_controller_00.write(0x04, 0x1)
+
+            # Small margin for the AXI/FIFO latency
+            deadline = perf_counter() + fill_time * 1.01 + 10e-6
+            remaining = deadline - perf_counter()
+            if remaining > 2e-3:
+                sleep(remaining - 1e-3)
+            # sleep(0) releases the GIL while polling (the other threads, e.g. the caller of capture_stream, keep running)
+            while perf_counter() < deadline:
+                sleep(0)
+
+            latency = perf_counter() - start
+            self.capture_latencies.append(latency)
+        return latency
+
+    def adc_fill_time(self, number_of_32bits_samples):
+        """ Time (s) needed by the ADC 00 to fill number_of_32bits_samples in BRAM with the current sampling rate/decimation """
+        return number_of_32bits_samples * self.adc_decimation / (self.adc_fs * 1e6)
+
+    def get_data(self, number_of_32_bits_samples = 1024, mode="IQ", out=None):
+        """ Read the data capture in BRAM
+
+        Args:
+            number_of_32_bits_samples (int, optional): size of the capture. Defaults to 1024.
+            mode (str, optional): "IQ" or "Real". Defaults to "IQ".
+            out (numpy.ndarray, optional): preallocated output buffer (complex for IQ, int16 for Real) reused between
+                captures to avoid allocations, the returned array is a view of it. Defaults to None.
+        """
+        if mode not in ["IQ", "Real", "real"]:
+            raise ValueError("mode must be in ['IQ', 'Real']")
+        with self._capture_lock:
+            if mode == "IQ":
+                data = adc_bram_read_IQ(self.adc_mem_00, number_of_32_bits_samples, out=out)
+            else:
+                # In real mode the 256 axi stream as 128 bits at 0 (complex part = 0), only the first 128 bits are copied.
+                data = adc_bram_read_real(self.adc_mem_00, number_of_32_bits_samples, out=out)
+        return data
+
+    def capture_stream(self, number_of_32_bits_samples = 1024, count = None, mode = "IQ", pool_size = 3, drop = False, timeout = 1.0):
+        """Generator of continuous captures, read back by a background thread into a pool of preallocated buffers.
+
+        While the caller processes a capture, the thread already arms the ADC counter and reads back the next ones
+        (the capture BRAM is shared, so capture N+1 is only armed once capture N has been copied out of it).
+        adc_capture and get_data called by another thread during the stream wait for the capture in progress.
+        The statistics are kept in self.stream_stats : captured, delivered, dropped and late frames.
+
+        Example:
+            for data in sdr.capture_stream(4096, count = 1000):
+                process(data)
+
+        Args:
+            number_of_32_bits_samples (int, optional): size of each capture. Defaults to 1024.
+            count (int, optional): number of captures, None for an endless stream. Defaults to None.
+            mode (str, optional): "IQ" or "Real". Defaults to "IQ".
+            pool_size (int, optional): number of buffers (at least 2). Defaults to 3.
+            drop (bool, optional): when the caller falls behind, False waits for a free buffer (backpressure, the frame is
+                counted as late) and True drops the oldest capture not yet delivered. Defaults to False.
+            timeout (float, optional): timeout of each capture (see adc_capture). Defaults to 1.0.
+
+        Yields:
+            numpy.ndarray: a capture, its buffer goes back to the pool when the next capture is requested (copy it to keep it)
+        """
+        if pool_size < 2:
+            raise ValueError("pool_size must be at least 2")
         if mode == "IQ":
-            data = adc_bram_read_IQ(self.adc_mem_00, number_of_32_bits_samples)
+            dtype = np.complex128
         elif (mode == "Real") or (mode == "real"):
-            # In real mode the 256 axi stream as 128 bits at 0 (complex part = 0).
-            data_read = adc_bram_read(self.adc_mem_00, number_of_32_bits_samples)
-            data = np.zeros(int(data_read.size/2), dtype = np.int16)
-            n = 0
-            for i in range(0, data_read.size):
-                if (i%16 <= 7):
-                    data[n] = data_read[i]
-                    n = n + 1
+            dtype = np.int16
         else:
             raise ValueError("mode must be in ['IQ', 'Real']")
-        return data
+
+        free = queue.Queue()
+        for _ in range(pool_size):
+            free.put(np.empty(number_of_32_bits_samples, dtype = dtype))
+        ready = queue.Queue()
+        stop = threading.Event()
+        stats = {"captured": 0, "delivered": 0, "dropped": 0, "late": 0}
+        self.stream_stats = stats
+
+        def get_buffer():
+            try:
+                return free.get_nowait()
+            except queue.Empty:
+                pass
+            if drop:
+                try:
+                    buffer, _ = ready.get_nowait()
+                    stats["dropped"] += 1
+                    return buffer
+                except queue.Empty:
+                    pass
+            else:
+                stats["late"] += 1
+            while not stop.is_set():
+                try:
+                    return free.get(timeout = 0.1)
+                except queue.Empty:
+                    pass
+            return None
+
+        def producer():
+            try:
+                while not stop.is_set() and (count is None or stats["captured"] < count):
+                    buffer = get_buffer()
+                    if buffer is None:
+                        break
+                    # The capture is read back before another thread can arm the ADC counter again
+                    with self._capture_lock:
+                        self.adc_capture(number_of_32_bits_samples, timeout = timeout)
+                        data = self.get_data(number_of_32_bits_samples, mode = mode, out = buffer)
+                    stats["captured"] += 1
+                    ready.put((buffer, data))
+                ready.put(None)
+            except Exception as error:
+                ready.put(error)
+
+        thread = threading.Thread(target = producer, daemon = True)
+        thread.start()
+        previous = None
+        try:
+            while True:
+                if previous is not None:
+                    free.put(previous)
+                    previous = None
+                item = ready.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                previous, data = item
+                stats["delivered"] += 1
+                yield data
+        finally:
+            stop.set()
+            thread.join()
 
     def set_dac_controller(self, tile, dac, number_of_32bits_samples):
         """Set the controller associated with the driver of a DAC using its tile index and the DAC number in its tile.
@@ -198,6 +551,10 @@ class SdrOverlay(Overlay):
         You can choose the number of 32 bits samples you want to capture.
         """
         self._check_if_dac_is_valid(tile, dac)
+        with self._dac_locks[(tile, dac)]:
+            self._set_dac_controller(tile, dac, number_of_32bits_samples)
+
+    def _set_dac_controller(self, tile, dac, number_of_32bits_samples):
         self.check_data_width(tile, dac, number_of_32bits_samples)
         if (tile == 0):
             if (dac == 0):
@@ -232,6 +589,79 @@ class SdrOverlay(Overlay):
 
 ########## RFDC Settings ###################
 
+    @contextmanager
+    def configure(self, verbose = True):
+        """Batch the converter settings : inside the block the setters are recorded, they are applied at the exit,
+        once per tile with one FIFO cycle (none if no setting changes) and one mixer update per block (see transaction.py).
+
+        Example:
+            with sdr.configure() as report:
+                sdr.set_dac_tile_pll(0, Fs = 4096)
+                sdr.set_dac_tile_IQ(0, interpolation_factor = 4, nco_freq = 1000)
+                sdr.set_dac_nco(0, 1, 1200)
+                sdr.update_dac_mixer(0, 1)
+            print(report["saved"])
+
+        Nested blocks (e.g. the mode setters) join the outer one. If the block raises, nothing is written.
+
+        Args:
+            verbose (bool, optional): print the number of hardware operations applied and saved. Defaults to True.
+
+        Yields:
+            dict: filled at the exit with "recorded", "applied", "saved", "unchanged" (skipped by the shadow copy), "fifo_cycles" and "update_events"
+        """
+        report = {}
+        if self._transaction is not None:
+            yield report
+            return
+        # Python side mirrors of the settings, restored if the block raises
+        state = (list(self.dac_fs), list(self.dac_interpolation), self.adc_fs, self.adc_decimation,
+                 list(self.dacs_tiles_mode), list(self.adcs_tiles_mode))
+        rfdc = self.rfdc
+        skipped = rfdc.skipped
+        self._transaction = RfdcTransaction(rfdc)
+        self.rfdc = self._transaction
+        try:
+            yield report
+        except BaseException:
+            (self.dac_fs, self.dac_interpolation, self.adc_fs, self.adc_decimation,
+             self.dacs_tiles_mode, self.adcs_tiles_mode) = state
+            raise
+        finally:
+            transaction = self._transaction
+            self.rfdc = rfdc
+            self._transaction = None
+        report.update(transaction.commit())
+        # Settings applied with the value already set, skipped by the shadow copy (see resync)
+        report["unchanged"] = rfdc.skipped - skipped
+        if verbose:
+            print(f"Configuration : {report['applied']} hardware operations ({report['saved']} saved, {report['unchanged']} unchanged, "
+                  f"{report['fifo_cycles']} FIFO cycles, {report['update_events']} mixer updates)")
+
+    def resync(self):
+        """Read the converter settings back from the driver into the shadow copy of rfdc and the Python mirrors
+        (sampling rates, interpolation/decimation, modes).
+
+        To be called when the rfdc was configured without this object (other program, reset, usp_rf_data_converter_0 used directly).
+        """
+        if self._transaction is not None:
+            raise ValueError("resync can not be called inside a configure() block")
+        self.rfdc.resync({0: self.dacs_tile0, 1: self.dacs_tile1}, {0: self.adcs_tile0})
+
+        for tile in self.dacs_tiles:
+            tile_rfdc = self.rfdc.dac_tiles[tile]
+            self.dac_fs[tile] = tile_rfdc.PLLConfig["SampleRate"] * 1e3
+            blocks = self.dacs_tile0 if tile == 0 else self.dacs_tile1
+            mixer = tile_rfdc.blocks[blocks[0]].MixerSettings
+            # Real mode : mixer bypassed (MixerMode 4 = Real to Real)
+            self.dacs_tiles_mode[tile] = "Real" if mixer["MixerMode"] == 4 else "IQ"
+            self.dac_interpolation[tile] = tile_rfdc.blocks[blocks[0]].InterpolationFactor
+        adc = self.rfdc.adc_tiles[0]
+        self.adc_fs = adc.PLLConfig["SampleRate"] * 1e3
+        self.adcs_tiles_mode[0] = "Real" if adc.blocks[0].MixerSettings["MixerMode"] == 4 else "IQ"
+        # The decimation is written in InterpolationFactor (see set_adc_decmation), DecimationFactor if never written
+        self.adc_decimation = getattr(adc.blocks[0], "InterpolationFactor", None) or adc.blocks[0].DecimationFactor
+
     def set_dac_tile_pll(self, tile, Fs = 6144):
         """Configures a DAC tile's PLL (rfdc), allowing you to choose your tile's sampling frequency.
 
@@ -242,6 +672,7 @@ class SdrOverlay(Overlay):
         if tile not in self.dacs_tiles:
             raise ValueError("Wrong tile value")
         self.rfdc.dac_tiles[tile].DynamicPLLConfig(1, self.ref_clock, Fs)
+        self.dac_fs[tile] = Fs
     
     def set_adc_tile_pll(self, Fs = 4096):
         """Configures the ADC tile 0 PLL (rfdc), allowing you to choose your tile sampling frequency.
@@ -250,6 +681,7 @@ class SdrOverlay(Overlay):
             Fs (int, optional):  Sampling Rate in MHz (MSPs), Fs must be a multiple of 409.6 MHz. Defaults to 4096 (Maximum).
         """
         self.rfdc.adc_tiles[0].DynamicPLLConfig(1, self.ref_clock, Fs)
+        self.adc_fs = Fs
 
     def set_all_pll(self, Fs = 4096):
         """Set all the PLL Config with the same Sampling Rate.
@@ -261,6 +693,25 @@ class SdrOverlay(Overlay):
             self.set_dac_tile_pll(tile = tile, Fs = Fs)
         self.set_adc_tile_pll(Fs = Fs)
 
+    def dac_sample_rate(self, tile):
+        """ Rate (MHz) of the samples in the DAC memories of a tile : 16 bits samples in Real mode, complex samples in IQ mode """
+        if tile not in self.dacs_tiles:
+            raise ValueError("Wrong tile value")
+        return self.dac_fs[tile] / self.dac_interpolation[tile]
+
+    def match_dac_rate(self, tile, signal, Fs):
+        """Resample a signal built at another rate to the current rate of a DAC tile (see dac_sample_rate).
+
+        Args:
+            tile (int): tile index (0 or 1)
+            signal (numpy.ndarray): real or complex samples (not yet packed in int32)
+            Fs (float): sampling rate of signal in MHz
+
+        Returns:
+            numpy.ndarray: the signal at dac_sample_rate(tile), to pack with complex_to_dc_32bits_format (IQ) or concat (Real)
+        """
+        return resample_to_rate(signal, Fs, self.dac_sample_rate(tile))
+
     def set_dac_nco(self, tile, dac, nco):
         """Set the Numerical Control Oscillator (NCO) of a DAC in a specific tile
 
@@ -334,6 +785,7 @@ class SdrOverlay(Overlay):
             self.rfdc.dac_tiles[tile].FabClkOutDiv = 4
 
         self.rfdc.dac_tiles[tile].InterpolationFactor = interpolation_factor
+        self.dac_interpolation[tile] = interpolation_factor
 
         if (tile == 0):
             for dac in self.dacs_tile0:
@@ -366,6 +818,7 @@ class SdrOverlay(Overlay):
             self.rfdc.adc_tiles[0].FabClkOutDiv = 4
 
         self.rfdc.adc_tiles[0].InterpolationFactor = decimation_factor
+        self.adc_decimation = decimation_factor
         self.rfdc.adc_tiles[0].blocks[0].InterpolationFactor = decimation_factor
         self.rfdc.adc_tiles[0].blocks[0].IntrClr = 4294967295
 
@@ -461,78 +914,82 @@ class SdrOverlay(Overlay):
         if tile not in self.dacs_tiles:
             raise ValueError("Wrong tile value")
         
-        self.dacs_tiles_mode[tile] = "Real"
+        with self.configure(verbose = False):
+            self.dacs_tiles_mode[tile] = "Real"
         
-        interpolation_factor = 1
-        if tile == 0:
-            # change f_axi frequency
-            for dac in self.dacs_tile0:
-                self.rfdc.dac_tiles[tile].blocks[dac].MixerSettings = {
-                    'CoarseMixFreq':  16,
-                    'EventSource':    2,
-                    'FineMixerScale': 0,
-                    'Freq':           0.0,
-                    'MixerMode':      4,
-                    'MixerType':      1,
-                    'PhaseOffset':    0.0
-                }
-                self.rfdc.dac_tiles[tile].blocks[dac].NyquistZone = 1
-
-            for dac in self.dacs_tile0:
-                self.rfdc.dac_tiles[tile].SetupFIFO(False)
-                self.rfdc.dac_tiles[tile].FabClkOutDiv = 2
-                self.rfdc.dac_tiles[tile].InterpolationFactor = interpolation_factor
-                self.rfdc.dac_tiles[tile].blocks[dac].InterpolationFactor = interpolation_factor
-                self.rfdc.adc_tiles[tile].blocks[dac].IntrClr = 4294967295
-                self.rfdc.dac_tiles[tile].SetupFIFO(True)
+            interpolation_factor = 1
+            self.dac_interpolation[tile] = interpolation_factor
+            if tile == 0:
+                # change f_axi frequency
+                for dac in self.dacs_tile0:
+                    self.rfdc.dac_tiles[tile].blocks[dac].MixerSettings = {
+                        'CoarseMixFreq':  16,
+                        'EventSource':    2,
+                        'FineMixerScale': 0,
+                        'Freq':           0.0,
+                        'MixerMode':      4,
+                        'MixerType':      1,
+                        'PhaseOffset':    0.0
+                    }
+                    self.rfdc.dac_tiles[tile].blocks[dac].NyquistZone = 1
+
+                for dac in self.dacs_tile0:
+                    self.rfdc.dac_tiles[tile].SetupFIFO(False)
+                    self.rfdc.dac_tiles[tile].FabClkOutDiv = 2
+                    self.rfdc.dac_tiles[tile].InterpolationFactor = interpolation_factor
+                    self.rfdc.dac_tiles[tile].blocks[dac].InterpolationFactor = interpolation_factor
+                    self.rfdc.adc_tiles[tile].blocks[dac].IntrClr = 4294967295
+                    self.rfdc.dac_tiles[tile].SetupFIFO(True)
 
-        else:
+            else:
             
-            for dac in self.dacs_tile1:
-                self.rfdc.dac_tiles[tile].blocks[dac].MixerSettings = {
-                    'CoarseMixFreq':  16,
-                    'EventSource':    2,
-                    'FineMixerScale': 0,
-                    'Freq':           0.0,
-                    'MixerMode':      4,
-                    'MixerType':      1,
-                    'PhaseOffset':    0.0
-                }
-                self.rfdc.dac_tiles[tile].blocks[dac].NyquistZone = 1
-
-            for dac in self.dacs_tile1:
-                self.rfdc.dac_tiles[tile].SetupFIFO(False)
-                self.rfdc.dac_tiles[tile].FabClkOutDiv = 2
-                self.rfdc.dac_tiles[tile].InterpolationFactor = interpolation_factor
-                self.rfdc.dac_tiles[tile].blocks[dac].InterpolationFactor = interpolation_factor
-                self.rfdc.adc_tiles[tile].blocks[dac].IntrClr = 4294967295
-                self.rfdc.dac_tiles[tile].SetupFIFO(True)
-
-        self.update_dacs_mixer()
-        print(f"Tile : {tile} is now in Real Mode (Mixer = Bypass, Interpolation = 1)")
+                for dac in self.dacs_tile1:
+                    self.rfdc.dac_tiles[tile].blocks[dac].MixerSettings = {
+                        'CoarseMixFreq':  16,
+                        'EventSource':    2,
+                        'FineMixerScale': 0,
+                        'Freq':           0.0,
+                        'MixerMode':      4,
+                        'MixerType':      1,
+                        'PhaseOffset':    0.0
+                    }
+                    self.rfdc.dac_tiles[tile].blocks[dac].NyquistZone = 1
+
+                for dac in self.dacs_tile1:
+                    self.rfdc.dac_tiles[tile].SetupFIFO(False)
+                    self.rfdc.dac_tiles[tile].FabClkOutDiv = 2
+                    self.rfdc.dac_tiles[tile].InterpolationFactor = interpolation_factor
+                    self.rfdc.dac_tiles[tile].blocks[dac].InterpolationFactor = interpolation_factor
+                    self.rfdc.adc_tiles[tile].blocks[dac].IntrClr = 4294967295
+                    self.rfdc.dac_tiles[tile].SetupFIFO(True)
+
+            self.update_dacs_mixer()
+            print(f"Tile : {tile} is now in Real Mode (Mixer = Bypass, Interpolation = 1)")
 
 
     def set_adc_tile_real(self):
         """ Set all the ADC tile 0 in Real Mode """
-        self.adcs_tiles_mode[0] = "Real"
-        # Only one ADC 00
-        self.rfdc.adc_tiles[0].blocks[0].MixerSettings = {
-            'Freq': 0.0,
-            'PhaseOffset': 0.0,
-            'EventSource': 2,
-            'CoarseMixFreq': 16,
-            'MixerMode': 4,
-            'FineMixerScale': 0,
-            'MixerType': 1
-        }
-        interpolation_factor = 1
-        self.rfdc.adc_tiles[0].SetupFIFO(False)
-        self.rfdc.adc_tiles[0].FabClkOutDiv = 2
-        self.rfdc.adc_tiles[0].InterpolationFactor = interpolation_factor
-        self.rfdc.adc_tiles[0].blocks[0].InterpolationFactor = interpolation_factor
-        self.rfdc.adc_tiles[0].blocks[0].IntrClr = 4294967295
-        self.rfdc.adc_tiles[0].SetupFIFO(True)
-        self.rfdc.adc_tiles[0].blocks[0].UpdateEvent(xrfdc.EVENT_MIXER)
+        with self.configure(verbose = False):
+            self.adcs_tiles_mode[0] = "Real"
+            # Only one ADC 00
+            self.rfdc.adc_tiles[0].blocks[0].MixerSettings = {
+                'Freq': 0.0,
+                'PhaseOffset': 0.0,
+                'EventSource': 2,
+                'CoarseMixFreq': 16,
+                'MixerMode': 4,
+                'FineMixerScale': 0,
+                'MixerType': 1
+            }
+            interpolation_factor = 1
+            self.rfdc.adc_tiles[0].SetupFIFO(False)
+            self.rfdc.adc_tiles[0].FabClkOutDiv = 2
+            self.rfdc.adc_tiles[0].InterpolationFactor = interpolation_factor
+            self.adc_decimation = interpolation_factor
+            self.rfdc.adc_tiles[0].blocks[0].InterpolationFactor = interpolation_factor
+            self.rfdc.adc_tiles[0].blocks[0].IntrClr = 4294967295
+            self.rfdc.adc_tiles[0].SetupFIFO(True)
+            self.rfdc.adc_tiles[0].blocks[0].UpdateEvent(xrfdc.EVENT_MIXER)
 
 
     # IQ
@@ -550,36 +1007,37 @@ class SdrOverlay(Overlay):
         if tile not in [0, 1]:
             raise ValueError("tile must be in [0, 1]")
         
-        self.dacs_tiles_mode[tile] = "IQ"
-
-        if tile == 0:
-            for dac in self.dacs_tile0:
-                self.rfdc.dac_tiles[0].blocks[dac].MixerSettings = {
-                    'CoarseMixFreq':  0,
-                    'EventSource':    2,
-                    'FineMixerScale': 0,
-                    'Freq':           nco_freq,
-                    'MixerMode':      2,
-                    'MixerType':      2,
-                    'PhaseOffset':    0.0
-                }
-                self.rfdc.dac_tiles[0].blocks[dac].NyquistZone = nz
-                self.rfdc.dac_tiles[0].blocks[dac].UpdateEvent(xrfdc.EVENT_MIXER)
-        else:
-            for dac in self.dacs_tile1:
-                self.rfdc.dac_tiles[1].blocks[dac].MixerSettings = {
-                    'CoarseMixFreq':  0,
-                    'EventSource':    2,
-                    'FineMixerScale': 0,
-                    'Freq':           nco_freq,
-                    'MixerMode':      2,
-                    'MixerType':      2,
-                    'PhaseOffset':    0.0
-                }
-                self.rfdc.dac_tiles[1].blocks[dac].NyquistZone = nz
-                self.rfdc.dac_tiles[1].blocks[dac].UpdateEvent(xrfdc.EVENT_MIXER)
-        # Set the interpolation factor
-        self.set_dac_interpolation(tile = tile, interpolation_factor=interpolation_factor)
+        with self.configure(verbose = False):
+            self.dacs_tiles_mode[tile] = "IQ"
+
+            if tile == 0:
+                for dac in self.dacs_tile0:
+                    self.rfdc.dac_tiles[0].blocks[dac].MixerSettings = {
+                        'CoarseMixFreq':  0,
+                        'EventSource':    2,
+                        'FineMixerScale': 0,
+                        'Freq':           nco_freq,
+                        'MixerMode':      2,
+                        'MixerType':      2,
+                        'PhaseOffset':    0.0
+                    }
+                    self.rfdc.dac_tiles[0].blocks[dac].NyquistZone = nz
+                    self.rfdc.dac_tiles[0].blocks[dac].UpdateEvent(xrfdc.EVENT_MIXER)
+            else:
+                for dac in self.dacs_tile1:
+                    self.rfdc.dac_tiles[1].blocks[dac].MixerSettings = {
+                        'CoarseMixFreq':  0,
+                        'EventSource':    2,
+                        'FineMixerScale': 0,
+                        'Freq':           nco_freq,
+                        'MixerMode':      2,
+                        'MixerType':      2,
+                        'PhaseOffset':    0.0
+                    }
+                    self.rfdc.dac_tiles[1].blocks[dac].NyquistZone = nz
+                    self.rfdc.dac_tiles[1].blocks[dac].UpdateEvent(xrfdc.EVENT_MIXER)
+            # Set the interpolation factor
+            self.set_dac_interpolation(tile = tile, interpolation_factor=interpolation_factor)
 
     def set_adc_tile_IQ(self, decimation_factor = 2, nco_freq = 1024, nz = 1):
         """ Set the ADC tile 0 in IQ mode
@@ -588,19 +1046,20 @@ class SdrOverlay(Overlay):
             decimation_factor (int, optional): ADC decimation factor (2, 4 or 8), 1 is not compatible. Defaults to 2.
         """
         
-        self.adcs_tiles_mode[0] = "IQ"
-        self.rfdc.adc_tiles[0].blocks[0].MixerSettings = {
-                'CoarseMixFreq':  0,
-                'EventSource':    2,
-                'FineMixerScale': 0,
-                'Freq':           nco_freq,
-                'MixerMode':      3,
-                'MixerType':      2,
-                'PhaseOffset':    0.0
-            }
-        self.rfdc.adc_tiles[0].blocks[0].NyquistZone = nz
-        self.rfdc.adc_tiles[0].blocks[0].UpdateEvent(xrfdc.EVENT_MIXER)
-        self.set_adc_decmation(decimation_factor=decimation_factor)  
+        with self.configure(verbose = False):
+            self.adcs_tiles_mode[0] = "IQ"
+            self.rfdc.adc_tiles[0].blocks[0].MixerSettings = {
+                    'CoarseMixFreq':  0,
+                    'EventSource':    2,
+                    'FineMixerScale': 0,
+                    'Freq':           nco_freq,
+                    'MixerMode':      3,
+                    'MixerType':      2,
+                    'PhaseOffset':    0.0
+                }
+            self.rfdc.adc_tiles[0].blocks[0].NyquistZone = nz
+            self.rfdc.adc_tiles[0].blocks[0].UpdateEvent(xrfdc.EVENT_MIXER)
+            self.set_adc_decmation(decimation_factor=decimation_factor)  
 
     ### Print methods ###     
 
@@ -702,44 +1161,21 @@ class SdrOverlay(Overlay):
     #     # For a better demonstration of 16-QAM communicaiton, I advise you to use example 3 in the nootbook.
 
 
-    def _find_solution(self, f, Fs = 4096e6, max_value = 0.5e6, opt = "min"):
-        """ Try to fix the problem of data format (size multiple of 64) by giving a compatible number of périods. For a sin wave.
+    def _find_solution(self, f, Fs = 4096e6, max_value = 0.5e6, opt = "min", granularity = BRAM_GRANULARITY):
+        """ Number of periods of a sin wave giving a seamless loop in Real mode (see planner.plan_loop), 0 if there is none.
 
         Args:
             f (int): sin wave frequency
             Fs (_type_, optional): Sampling Rate in Hz. Defaults to 4096e6.
             max_value (_type_, optional): The maximum number of 32 bits sample inside a memory. Defaults to 0.5e6.
             opt (str, optional): "max" or "min", you can choose to have the biggest number of period or the lowest. Defaults to "min".
+            granularity (int, optional): the number of 32 bits samples is a multiple of it (32 BRAM/URAM, 16 DDR4). Defaults to 32.
 
         Returns:
             int: The number of period to generate the sin wave
         """
-        
-        if opt == "min":
-            valid_np = 0
-            k = 1
-            while True:
-                np = (k * 64 * f) / Fs
-                if np >= 1 and np.is_integer() and (Fs / f) * np < max_value/2 - 8:
-                    valid_np = int(np)
-                    break
-                elif ((Fs / f) * np)*2 >= max_value:
-                    break
-                k += 1
-        elif opt == "max":
-            valid_np = 0
-            k = 1
-            while True:
-                np = (k * 64 * f) / Fs
-                if np >= 1 and np.is_integer() and (Fs / f) * np < max_value:
-                    valid_np = int(np)
-                elif ((Fs / f) * np)*2 >= max_value:
-                    break
-                k += 1
-        else:
-            raise ValueError("opt is 'min' or 'max'")
-            
-        return valid_np
+        plan = plan_loop(f, Fs, granularity = granularity, capacity = int(max_value), samples_per_word = 2, opt = opt)
+        return plan["periods"][0] if plan["exact"] else 0
 
     def demo_sin(self, Fs = 4096e6, f = 128e6, capture_size = None):
         """ Demonstration function : All DACs are used to send a sin wave and ADC 00 can be used for a loopback.
@@ -765,14 +1201,17 @@ class SdrOverlay(Overlay):
 
         self.update_dacs_mixer()
 
-        number_of_periods = self._find_solution(f = f, Fs = Fs, max_value = 0.5e6, opt = "max") # max_value lower for security
-        if (number_of_periods == 0):
-            raise ValueError("Fs and f are not compatible for the platform !")
-        
+        # The same sinus is loaded in all the memories : the capacity of the smallest one (not its MMIO window) and the
+        # granularity of all (32 and 16)
+        capacity = min(capacity for _, _, _, capacity in self.dac_memories.values())
+        plan = plan_loop(f, Fs, granularity = BRAM_GRANULARITY, capacity = capacity, samples_per_word = 2, opt = "max")
+        if not plan["exact"]:
+            print(f"WARNING : no seamless loop of {f} Hz fits in the memories, f = {plan['frequencies'][0]} Hz (error {plan['error'][0]:.3g} Hz)")
+
         print("SIN GEN :")
-        print(f"\tNumber of 16 bits samples (N) = {int(number_of_periods*Fs/f)}, number of periods for the sinus = {number_of_periods}")
-        print(f"\tMemory Usage : {int(number_of_periods*Fs/f)*2/1e6} Mbytes")
-        sinus = sin_gen(Fs = Fs, f = f, number_of_periods = number_of_periods, plot = False)
+        print(f"\tNumber of 16 bits samples (N) = {plan['number_of_samples']}, number of periods for the sinus = {plan['periods'][0]}")
+        print(f"\tMemory Usage : {plan['number_of_samples']*2/1e6} Mbytes")
+        sinus = sin_gen(Fs = Fs, f = plan["frequencies"][0], number_of_samples = plan["number_of_samples"], plot = False)
 
         # Load the DATA in all DAC Driver
         for dac in self.dacs_tile0:
@@ -792,11 +1231,9 @@ class SdrOverlay(Overlay):
         self.set_adc_tile_real()
         if capture_size == None:
             self.adc_capture(number_of_32bits_samples = number_of_32bits_samples)
-            sleep(1)
             data_adc = self.get_data(number_of_32_bits_samples = number_of_32bits_samples, mode = "Real")
         else:
             self.adc_capture(number_of_32bits_samples = capture_size)
-            sleep(1)
             data_adc = self.get_data(number_of_32_bits_samples = capture_size, mode = "Real")
             
         return data_adc
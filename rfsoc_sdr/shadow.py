@@ -0,0 +1,173 @@
+# Shadow copy of the RF data converter (xrfdc) settings, see SdrOverlay.resync
+#
+# RfdcShadow stands in for the rfdc object and keeps the last value of each setting written (or read) per tile and
+# per block : writing the value already set does nothing, reading a setting does not access the driver once it is
+# known. The state is only known after a write or a resync (reading back the driver), a setting never seen is read
+# from the driver the first time. DynamicPLLConfig is skipped when the PLL was already set to the same source and
+# rate through this object (a resync forgets it, PLLConfig does not give the source).
+
+from math import isclose
+
+from transaction import MixerSettingsView
+
+# Settings kept in the shadow (the other attributes, e.g. IntrClr, are always written)
+TILE_SETTINGS = ("PLLConfig", "FabClkOutDiv", "InterpolationFactor")
+BLOCK_SETTINGS = ("MixerSettings", "NyquistZone", "InterpolationFactor")
+
+
+def _same(a, b):
+    """ Equality of two settings (floats compared with a relative tolerance, the driver rounds them) """
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(_same(a[key], b[key]) for key in a)
+    if isinstance(a, float) or isinstance(b, float):
+        try:
+            return isclose(a, b, rel_tol=1e-9, abs_tol=1e-9)
+        except TypeError:
+            return False
+    return a == b
+
+
+def _write(cache, target, name, value, settings):
+    """ Write a setting to the driver, the cache is updated once the driver accepted it (unknown if it raised) """
+    try:
+        setattr(target, name, value)
+    except Exception:
+        cache.pop(name, None)
+        raise
+    if name in settings:
+        cache[name] = value
+
+
+class _ShadowBlock:
+    """ DAC or ADC block with its cached settings """
+
+    def __init__(self, shadow, block):
+        object.__setattr__(self, "_shadow", shadow)
+        object.__setattr__(self, "_block", block)
+        object.__setattr__(self, "cache", {})
+
+    def __getattr__(self, name):
+        if name not in BLOCK_SETTINGS:
+            return getattr(self._block, name)
+        if name not in self.cache:
+            self.cache[name] = dict(self._block.MixerSettings) if name == "MixerSettings" else getattr(self._block, name)
+        if (name == "MixerSettings"):
+            return MixerSettingsView(self, self.cache[name])
+        return self.cache[name]
+
+    def __setattr__(self, name, value):
+        if name in BLOCK_SETTINGS:
+            value = dict(value) if name == "MixerSettings" else value
+            if name in self.cache and _same(self.cache[name], value):
+                self._shadow.skipped += 1
+                return
+        self._shadow.written += 1
+        _write(self.cache, self._block, name, value, BLOCK_SETTINGS)
+
+    def unchanged(self, name, value):
+        """ True if writing value to name would be skipped """
+        if (name == "MixerSettings"):
+            value = dict(value)
+        return name in self.cache and _same(self.cache[name], value)
+
+    def resync(self):
+        self.cache.clear()
+        for name in BLOCK_SETTINGS:
+            # Some settings are not readable on every block (never written)
+            try:
+                getattr(self, name)
+            except AttributeError:
+                pass
+
+
+class _ShadowTile:
+    """ DAC or ADC tile with its cached settings """
+
+    def __init__(self, shadow, tile):
+        object.__setattr__(self, "_shadow", shadow)
+        object.__setattr__(self, "_tile", tile)
+        object.__setattr__(self, "cache", {})
+        # (source, ref_clk_freq, samp_rate) of the PLL, None if unknown
+        object.__setattr__(self, "pll", None)
+        object.__setattr__(self, "blocks", [_ShadowBlock(shadow, block) for block in tile.blocks])
+
+    def __getattr__(self, name):
+        if name not in TILE_SETTINGS:
+            return getattr(self._tile, name)
+        if name not in self.cache:
+            value = getattr(self._tile, name)
+            self.cache[name] = dict(value) if name == "PLLConfig" else value
+        return self.cache[name]
+
+    def __setattr__(self, name, value):
+        if name in TILE_SETTINGS:
+            if name in self.cache and _same(self.cache[name], value):
+                self._shadow.skipped += 1
+                return
+        self._shadow.written += 1
+        _write(self.cache, self._tile, name, value, TILE_SETTINGS)
+
+    def unchanged(self, name, value):
+        """ True if writing value to name would be skipped """
+        return name in self.cache and _same(self.cache[name], value)
+
+    def DynamicPLLConfig(self, source, ref_clk_freq, samp_rate):
+        pll = (source, ref_clk_freq, samp_rate)
+        if self.pll is not None and all(_same(a, b) for a, b in zip(self.pll, pll)):
+            self._shadow.skipped += 1
+            return
+        self._shadow.written += 1
+        try:
+            self._tile.DynamicPLLConfig(source, ref_clk_freq, samp_rate)
+        except Exception:
+            object.__setattr__(self, "pll", None)
+            raise
+        object.__setattr__(self, "pll", pll)
+        # PLLConfig is read back from the driver at the next access
+        self.cache.pop("PLLConfig", None)
+
+    def resync(self, blocks):
+        self.cache.clear()
+        for name in TILE_SETTINGS:
+            try:
+                getattr(self, name)
+            except AttributeError:
+                pass
+        # The source of the PLL is not in PLLConfig : the next DynamicPLLConfig is always written
+        object.__setattr__(self, "pll", None)
+        for block in blocks:
+            self.blocks[block].resync()
+
+
+class RfdcShadow:
+    """Caches the settings of an rfdc object (same interface : dac_tiles, adc_tiles, blocks).
+
+    Example:
+        rfdc = RfdcShadow(overlay.usp_rf_data_converter_0)
+        rfdc.dac_tiles[0].DynamicPLLConfig(1, 409.6, 6144)
+        rfdc.dac_tiles[0].DynamicPLLConfig(1, 409.6, 6144)     # skipped, the PLL is already locked at 6144 MHz
+        print(rfdc.skipped)
+    """
+
+    def __init__(self, rfdc):
+        self.rfdc = rfdc
+        # Number of writes done and skipped (same value as the current one)
+        self.written = 0
+        self.skipped = 0
+        self.dac_tiles = [_ShadowTile(self, tile) for tile in rfdc.dac_tiles]
+        self.adc_tiles = [_ShadowTile(self, tile) for tile in rfdc.adc_tiles]
+
+    def __getattr__(self, name):
+        return getattr(self.rfdc, name)
+
+    def resync(self, dac_blocks, adc_blocks):
+        """Read the settings back from the driver (after a change made without this object, a reset, ...).
+
+        Args:
+            dac_blocks (dict): {tile: [blocks]} the DAC tiles and blocks to read
+            adc_blocks (dict): {tile: [blocks]} the ADC tiles and blocks to read
+        """
+        for tile, blocks in dac_blocks.items():
+            self.dac_tiles[tile].resync(blocks)
+        for tile, blocks in adc_blocks.items():
+            self.adc_tiles[tile].resync(blocks)
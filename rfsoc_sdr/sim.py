@@ -0,0 +1,219 @@
+# Simulated hardware, used to run and benchmark the code without a ZCU111
+#
+# It provides the same names as the PYNQ backend (Overlay, MMIO, xrfclk, xrfdc), see backend.py.
+# The memories are files mapped with numpy.memmap (with their real address and size), the converters
+# (rfdc) only keep their settings and the counters have a simple behaviour :
+#   - the DAC controllers keep the values written in their registers
+#   - the ADC counter is a loopback of DAC 00 (like the cable in the notebook) : when the capture is
+#     started, the ADC BRAM is filled with the words played by DAC 00 (the data format is not converted)
+
+import os
+import tempfile
+from types import SimpleNamespace
+import numpy as np
+
+from planner import MEMORY_SIZES
+
+# Directory of the files backing the simulated memories
+SIM_DIR = os.environ.get("RFSOC_SDR_SIM_DIR", os.path.join(tempfile.gettempdir(), "rfsoc_sdr_sim"))
+
+
+class MmapMMIO:
+    """File-backed stand-in for pynq.MMIO.
+
+    The memory region is a file mapped with numpy.memmap, it exposes the same interface as
+    pynq.MMIO (read, write and the uint32 'array' view of the region).
+    """
+
+    def __init__(self, base_addr, length, path=None):
+        """Map (and create if needed) the file backing the memory region.
+
+        Args:
+            base_addr (int): physical address of the region (used to name the file)
+            length (int): length of the region in bytes, as given to pynq.MMIO
+            path (str, optional): backing file. Defaults to a file named after base_addr in SIM_DIR,
+                so all the MMIO of the same address share the same memory.
+        """
+        self.base_addr = base_addr
+        self.length = length
+        if path is None:
+            os.makedirs(SIM_DIR, exist_ok=True)
+            path = os.path.join(SIM_DIR, f"mem_{base_addr:#011x}.bin")
+        self.path = path
+
+        # Same number of 32 bits words as the array of pynq.MMIO, at most the size of the memory of the design at
+        # this address (a bigger window does not give more memory)
+        size = length // 4
+        if base_addr in MEMORY_SIZES:
+            size = min(size, MEMORY_SIZES[base_addr] // 4)
+        mode = "r+" if os.path.exists(path) and os.path.getsize(path) == size * 4 else "w+"
+        self.array = np.memmap(path, dtype=np.uint32, mode=mode, shape=(size,))
+
+    def read(self, offset=0, length=4):
+        if offset % 4 != 0 or length != 4:
+            raise ValueError("Only 32 bits aligned reads are supported")
+        return int(self.array[offset // 4])
+
+    def write(self, offset, data):
+        if offset % 4 != 0:
+            raise ValueError("Only 32 bits aligned writes are supported")
+        if isinstance(data, (bytes, bytearray)):
+            words = np.frombuffer(data, dtype=np.uint32)
+            self.array[offset // 4: offset // 4 + words.size] = words
+        else:
+            self.array[offset // 4] = int(data) & 0xFFFFFFFF
+
+    def close(self):
+        """ Flush and unmap the backing file """
+        self.array.flush()
+        del self.array
+
+# Same name as in PYNQ
+MMIO = MmapMMIO
+
+
+### Counters / controllers (AXI Lite IPs) ###
+
+class RegisterIP:
+    """ Stand-in for a pynq DefaultIP with 32 bits registers (read/write at a byte offset) """
+
+    def __init__(self, number_of_registers=16):
+        self.registers = np.zeros(number_of_registers, dtype=np.uint32)
+
+    def read(self, offset=0):
+        return int(self.registers[offset // 4])
+
+    def write(self, offset, value):
+        previous = int(self.registers[offset // 4])
+        self.registers[offset // 4] = int(value) & 0xFFFFFFFF
+        self.on_write(offset, previous, int(value) & 0xFFFFFFFF)
+
+    def on_write(self, offset, previous, value):
+        """ Called after each write, overridden by the IPs with a behaviour """
+        pass
+
+
+class AdcCounterIP(RegisterIP):
+    """ADC capture counter (0x00 : counter max, 0x04 : enable) looped back on DAC 00.
+
+    A rising edge on the enable register fills (counter max + 1) 256 bits words of the ADC BRAM
+    with the words played by DAC 00 (BRAM(0) and its counter), repeated if needed.
+    """
+
+    def __init__(self, adc_mem, dac_mem, dac_counter):
+        super().__init__()
+        self.adc_mem = adc_mem
+        self.dac_mem = dac_mem
+        self.dac_counter = dac_counter
+        self.captures = 0
+
+    def on_write(self, offset, previous, value):
+        if offset == 0x04 and previous == 0 and value == 1:
+            self.capture()
+
+    def capture(self):
+        # Import here, dc.py imports this module through backend.py
+        from dc import BRAM_LINE_ORDER
+        number_of_32bits_samples = min((self.read(0x00) + 1) * 8, self.adc_mem.array.size)
+        # DAC counter max = number of 1024 bits lines - 1
+        dac_size = min((self.dac_counter.read(0x00) + 1) * 32, self.dac_mem.array.size // 32 * 32)
+        played = self.dac_mem.array[:dac_size].reshape(-1, 32)[:, BRAM_LINE_ORDER].ravel()
+        self.adc_mem.array[:number_of_32bits_samples] = np.resize(played, number_of_32bits_samples)
+        self.captures += 1
+
+
+### RF Data Converter (xrfdc) ###
+
+class PropertyDict(dict):
+    """ Settings dictionary of a block (the items can be modified like with xrfdc) """
+    pass
+
+
+class RFdcBlock:
+    """ DAC or ADC block : only keeps its settings and counts the mixer update events """
+
+    def __init__(self):
+        self.MixerSettings = PropertyDict({
+            'CoarseMixFreq':  0,
+            'EventSource':    2,
+            'FineMixerScale': 0,
+            'Freq':           0.0,
+            'MixerMode':      2,
+            'MixerType':      2,
+            'PhaseOffset':    0.0
+        })
+        self.NyquistZone = 1
+        self.InterpolationFactor = 2
+        self.DecimationFactor = 2
+        self.IntrClr = 0
+        self.update_events = 0
+
+    def __setattr__(self, name, value):
+        if name == "MixerSettings":
+            value = PropertyDict(value)
+        super().__setattr__(name, value)
+
+    def UpdateEvent(self, event):
+        self.update_events += 1
+
+
+class RFdcTile:
+    """ DAC or ADC tile : PLL, FIFO and fabric clock settings """
+
+    def __init__(self):
+        self.blocks = [RFdcBlock() for _ in range(4)]
+        self.PLLConfig = {'Enabled': 1, 'RefClkFreq': 409.6, 'SampleRate': 4.096}
+        self.FabClkOutDiv = 2
+        self.InterpolationFactor = 2
+        self.fifo_enabled = True
+        self.fifo_resets = 0
+
+    def DynamicPLLConfig(self, source, ref_clk_freq, samp_rate):
+        self.PLLConfig = {'Enabled': 1, 'RefClkFreq': ref_clk_freq, 'SampleRate': samp_rate / 1e3}
+
+    def SetupFIFO(self, enable):
+        if not enable:
+            self.fifo_resets += 1
+        self.fifo_enabled = bool(enable)
+
+
+class RFdc:
+    """ usp_rf_data_converter_0 """
+
+    def __init__(self):
+        self.dac_tiles = [RFdcTile() for _ in range(4)]
+        self.adc_tiles = [RFdcTile() for _ in range(4)]
+
+
+xrfdc = SimpleNamespace(EVENT_MIXER=1, EVENT_CRSE_DLY=2, EVENT_QMC=4)
+xrfclk = SimpleNamespace(set_ref_clks=lambda *args, **kwargs: None, __file__=__file__)
+
+
+### Overlay ###
+
+class Overlay:
+    """Stand-in for pynq.Overlay with the IPs of the design used by SdrOverlay.
+
+    The bitstream is not read, the hierarchy (rfdc, DAC drivers and ADC capture) is built by hand.
+    """
+
+    def __init__(self, bitstream_path, *args, **kwargs):
+        self.bitfile_name = bitstream_path
+        self.usp_rf_data_converter_0 = RFdc()
+
+        bram_counter_0 = RegisterIP()
+        self.bram_dac_driver = SimpleNamespace(
+            bram_dac_driver_0=SimpleNamespace(bram_counter_0=bram_counter_0),
+            bram_dac_driver_1=SimpleNamespace(bram_counter_0=RegisterIP()))
+        self.uram_dac_driver = SimpleNamespace(
+            uram_dac_driver_0=SimpleNamespace(bram_counter_2_0=RegisterIP()),
+            uram_dac_driver_1=SimpleNamespace(bram_counter_2_0=RegisterIP()))
+        self.ddr4_dac_driver = SimpleNamespace(ddr_controller_0=RegisterIP())
+        self.bram_adc_capture = SimpleNamespace(adc_counter_v1_0_0=AdcCounterIP(
+            adc_mem=MMIO(0xA020_0000, 0x0010_0000), dac_mem=MMIO(0xA000_0000, 0x0010_0000), dac_counter=bram_counter_0))
+
+    def is_loaded(self):
+        return True
+
+    def download(self):
+        pass
@@ -0,0 +1,124 @@
+# Spectrum of the captures : Welch averaged PSD and amplitude spectrum, arrays first (see data.plot_fft to plot)
+#
+# Real signals (Real mode) use rfft and give a one-sided spectrum, complex signals (IQ mode) use fft and give a
+# two-sided spectrum from -Fs/2 to Fs/2. The FFTs are done by scipy.fft with several workers, in float32 or
+# float64, scipy.fft keeps the plans of the last sizes and the named windows are cached, so repeated measurements at
+# the same size only compute the FFTs.
+
+from functools import lru_cache
+
+import numpy as np
+import scipy.fft
+from scipy.signal import get_window, detrend as linear_detrend
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Number of segments transformed at once (limits the temporary memory of the long captures)
+SEGMENTS_PER_BATCH = 256
+
+
+DETRENDS = ["constant", "linear", False]
+
+
+@lru_cache(maxsize=32)
+def _named_window(window, size, dtype):
+    w = get_window(window, size).astype(dtype)
+    w.flags.writeable = False
+    return w
+
+
+def cached_window(window, size, dtype=np.float64):
+    """ Window array (read only) : a name or a tuple accepted by scipy.signal.get_window is cached, an array is used as is """
+    if isinstance(window, (str, tuple)):
+        return _named_window(window, size, np.dtype(dtype))
+    w = np.asarray(window, dtype=dtype)
+    if (w.shape != (size,)):
+        raise ValueError(f"The window must have {size} samples, got {w.shape}")
+    return w
+
+
+def _prepare(signal, dtype):
+    """ signal as float32/float64 or complex64/complex128 (see dtype) """
+    signal = np.asarray(signal)
+    if (np.dtype(dtype) not in (np.float32, np.float64)):
+        raise ValueError("dtype must be np.float32 or np.float64")
+    if np.iscomplexobj(signal):
+        return signal.astype(np.result_type(dtype, np.complex64), copy=False)
+    return signal.astype(dtype, copy=False)
+
+
+def _frequencies(nfft, Fs, onesided):
+    if onesided:
+        return scipy.fft.rfftfreq(nfft, 1 / Fs)
+    return scipy.fft.fftshift(scipy.fft.fftfreq(nfft, 1 / Fs))
+
+
+def psd(signal, Fs=1.0, nperseg=4096, overlap=0.5, window="hann", detrend="constant", dtype=np.float32, workers=-1):
+    """Power spectral density averaged over overlapping segments (Welch method).
+
+    Args:
+        signal (ndarray): real or complex samples (e.g. SdrOverlay.get_data)
+        Fs (float, optional): sampling rate. Defaults to 1.0.
+        nperseg (int, optional): length of the segments (frequency resolution Fs / nperseg). Defaults to 4096.
+        overlap (float, optional): overlap of the segments (0 to 1). Defaults to 0.5.
+        window (str, tuple or ndarray, optional): window of the segments (see scipy.signal.get_window) or its nperseg samples. Defaults to "hann".
+        detrend (str or bool, optional): "constant" removes the mean of each segment, "linear" its least squares
+            line, False nothing (like scipy.signal.welch). Defaults to "constant".
+        dtype (dtype, optional): np.float32 or np.float64, precision of the FFTs. Defaults to np.float32.
+        workers (int, optional): number of threads of scipy.fft (-1 : all the cores). Defaults to -1.
+
+    Returns:
+        tuple: (f, Pxx) frequencies (one-sided for a real signal, -Fs/2 to Fs/2 for a complex one) and PSD (unit**2/Hz)
+    """
+    if detrend not in DETRENDS:
+        raise ValueError(f"detrend must be one of {DETRENDS}")
+    signal = _prepare(signal, dtype)
+    nperseg = min(nperseg, signal.size)
+    step = max(int(nperseg * (1 - overlap)), 1)
+    onesided = not np.iscomplexobj(signal)
+    w = cached_window(window, nperseg, np.dtype(dtype))
+    transform = scipy.fft.rfft if onesided else scipy.fft.fft
+
+    segments = sliding_window_view(signal, nperseg)[::step]
+    power = np.zeros(nperseg // 2 + 1 if onesided else nperseg, dtype=dtype)
+    for start in range(0, segments.shape[0], SEGMENTS_PER_BATCH):
+        batch = segments[start:start + SEGMENTS_PER_BATCH]
+        if (detrend == "constant"):
+            batch = batch - batch.mean(axis=1, keepdims=True)
+        elif (detrend == "linear"):
+            batch = linear_detrend(batch, axis=1, type="linear")
+        spectrum = transform(batch * w, axis=1, workers=workers)
+        power += (spectrum.real**2 + spectrum.imag**2).sum(axis=0)
+
+    # Density scaling : mean over the segments, divided by Fs and by the power of the window
+    power /= segments.shape[0] * Fs * np.sum(w.astype(np.float64)**2)
+    if onesided:
+        # The negative frequencies are added to the positive ones (not DC and Nyquist)
+        power[1:(nperseg + 1) // 2] *= 2
+    else:
+        power = scipy.fft.fftshift(power)
+    return _frequencies(nperseg, Fs, onesided), power
+
+
+def amplitude_spectrum(signal, Fs=1.0, nfft=None, window=None, dtype=np.float64, workers=-1):
+    """Magnitude of the FFT of the whole signal (one segment, no averaging), like data.plot_fft.
+
+    Args:
+        signal (ndarray): real or complex samples
+        Fs (float, optional): sampling rate. Defaults to 1.0.
+        nfft (int, optional): number of points of the FFT (the signal is cut or padded with zeros). Defaults to None (signal.size).
+        window (str, tuple or ndarray, optional): window applied to the signal. Defaults to None (rectangular).
+        dtype (dtype, optional): np.float32 or np.float64, precision of the FFT. Defaults to np.float64.
+        workers (int, optional): number of threads of scipy.fft (-1 : all the cores). Defaults to -1.
+
+    Returns:
+        tuple: (f, magnitude) frequencies (one-sided for a real signal, -Fs/2 to Fs/2 for a complex one) and |FFT|
+    """
+    signal = _prepare(signal, dtype)
+    nfft = signal.size if not nfft else nfft
+    if window is not None:
+        size = min(nfft, signal.size)
+        signal = signal[:size] * cached_window(window, size, np.dtype(dtype))
+    if np.iscomplexobj(signal):
+        magnitude = np.abs(scipy.fft.fftshift(scipy.fft.fft(signal, nfft, workers=workers)))
+        return _frequencies(nfft, Fs, False), magnitude
+    return _frequencies(nfft, Fs, True), np.abs(scipy.fft.rfft(signal, nfft, workers=workers))
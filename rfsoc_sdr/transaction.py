@@ -0,0 +1,166 @@
+# Batched configuration of the RF data converter (xrfdc), see SdrOverlay.configure
+#
+# RfdcTransaction stands in for the rfdc object : the settings written to it (PLL, mixer, Nyquist zone,
+# interpolation/decimation, FIFO, update events) are recorded instead of being written, the values read are the
+# recorded ones (or the hardware ones if not modified). commit then applies them once per tile in this order :
+#   PLL -> FIFO disabled -> tile settings -> block settings (last value of each) -> interrupt clears -> FIFO enabled
+#   -> mixer update events
+# so a mode switch costs one FIFO cycle per tile and one mixer update event per block, whatever the number of setters.
+# An interrupt clear (IntrClr, written every time) belongs to the tile whose FIFO was disabled when it was written,
+# even on a block of another tile (the DAC mode setters clear the ADC blocks), and is applied in its FIFO window.
+# The FIFO cycle is skipped when the rfdc keeps a shadow of its settings and none of them changes (see shadow.py).
+
+
+class MixerSettingsView(dict):
+    """ Copy of the MixerSettings of a block : modifying an item writes the whole settings to the block (like xrfdc) """
+
+    def __init__(self, block, settings):
+        super().__init__(settings)
+        self._block = block
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._block.MixerSettings = dict(self)
+
+
+def _changes(target, settings):
+    """ True if writing the settings to target modifies it (always when target does not keep a shadow, see shadow.py) """
+    unchanged = getattr(type(target), "unchanged", None)
+    if unchanged is None:
+        return bool(settings)
+    return any(not unchanged(target, name, value) for name, value in settings.items())
+
+
+class _BlockRecorder:
+    """ DAC or ADC block of a transaction """
+
+    def __init__(self, transaction, tile, block):
+        object.__setattr__(self, "_transaction", transaction)
+        object.__setattr__(self, "_tile", tile)
+        object.__setattr__(self, "_block", block)
+        # Last value written for each setting, in the order of the first write
+        object.__setattr__(self, "settings", {})
+        object.__setattr__(self, "events", set())
+
+    def __getattr__(self, name):
+        value = self.settings[name] if name in self.settings else getattr(self._block, name)
+        if (name == "MixerSettings"):
+            return MixerSettingsView(self, value)
+        return value
+
+    def __setattr__(self, name, value):
+        self._transaction.recorded += 1
+        if (name == "IntrClr"):
+            owner = self._transaction.window if self._transaction.window is not None else self._tile
+            owner.clears.append((self._block, value))
+            return
+        self.settings[name] = dict(value) if name == "MixerSettings" else value
+
+    def UpdateEvent(self, event):
+        self._transaction.recorded += 1
+        self.events.add(event)
+
+
+class _TileRecorder:
+    """ DAC or ADC tile of a transaction """
+
+    def __init__(self, transaction, tile):
+        object.__setattr__(self, "_transaction", transaction)
+        object.__setattr__(self, "_tile", tile)
+        object.__setattr__(self, "settings", {})
+        object.__setattr__(self, "pll", None)
+        object.__setattr__(self, "fifo", False)
+        # Interrupt clears (block, value) to apply in the FIFO window of this tile
+        object.__setattr__(self, "clears", [])
+        object.__setattr__(self, "blocks", [_BlockRecorder(transaction, self, block) for block in tile.blocks])
+
+    def __getattr__(self, name):
+        return self.settings[name] if name in self.settings else getattr(self._tile, name)
+
+    def __setattr__(self, name, value):
+        self._transaction.recorded += 1
+        self.settings[name] = value
+
+    def DynamicPLLConfig(self, source, ref_clk_freq, samp_rate):
+        self._transaction.recorded += 1
+        object.__setattr__(self, "pll", (source, ref_clk_freq, samp_rate))
+
+    def SetupFIFO(self, enable):
+        # The settings written between SetupFIFO(False) and SetupFIFO(True) need a FIFO cycle at the commit
+        self._transaction.recorded += 1
+        if not enable:
+            object.__setattr__(self, "fifo", True)
+            self._transaction.window = self
+        elif self._transaction.window is self:
+            self._transaction.window = None
+
+
+class RfdcTransaction:
+    """Records the settings written to an rfdc object (same interface : dac_tiles, adc_tiles, blocks).
+
+    Example:
+        transaction = RfdcTransaction(rfdc)
+        transaction.dac_tiles[0].blocks[0].MixerSettings['Freq'] = 1000
+        transaction.dac_tiles[0].blocks[0].UpdateEvent(xrfdc.EVENT_MIXER)
+        report = transaction.commit()
+    """
+
+    def __init__(self, rfdc):
+        self.rfdc = rfdc
+        # Number of hardware operations asked by the setters
+        self.recorded = 0
+        # Tile recorder whose FIFO is disabled (between SetupFIFO(False) and SetupFIFO(True)), None if none
+        self.window = None
+        self.dac_tiles = [_TileRecorder(self, tile) for tile in rfdc.dac_tiles]
+        self.adc_tiles = [_TileRecorder(self, tile) for tile in rfdc.adc_tiles]
+
+    def __getattr__(self, name):
+        return getattr(self.rfdc, name)
+
+    def commit(self):
+        """Apply the recorded settings to the rfdc, tile by tile.
+
+        Returns:
+            dict: "recorded" (operations asked), "applied" (operations done), "saved", "fifo_cycles" and "update_events"
+        """
+        applied = 0
+        fifo_cycles = 0
+        update_events = 0
+        for recorders, tiles in [(self.dac_tiles, self.rfdc.dac_tiles), (self.adc_tiles, self.rfdc.adc_tiles)]:
+            for recorder, tile in zip(recorders, tiles):
+                if recorder.pll is not None:
+                    tile.DynamicPLLConfig(*recorder.pll)
+                    applied += 1
+                # No FIFO cycle if every setting is already set
+                fifo = recorder.fifo and (_changes(tile, recorder.settings) or
+                                          any(_changes(block, block_recorder.settings)
+                                              for block_recorder, block in zip(recorder.blocks, tile.blocks)))
+                if fifo:
+                    tile.SetupFIFO(False)
+                    applied += 1
+                for name, value in recorder.settings.items():
+                    setattr(tile, name, value)
+                    applied += 1
+                for block_recorder, block in zip(recorder.blocks, tile.blocks):
+                    for name, value in block_recorder.settings.items():
+                        setattr(block, name, value)
+                        applied += 1
+                for block, value in recorder.clears:
+                    block.IntrClr = value
+                    applied += 1
+                if fifo:
+                    tile.SetupFIFO(True)
+                    applied += 1
+                    fifo_cycles += 1
+                for block_recorder, block in zip(recorder.blocks, tile.blocks):
+                    for event in sorted(block_recorder.events):
+                        block.UpdateEvent(event)
+                        applied += 1
+                        update_events += 1
+        return {
+            "recorded": self.recorded,
+            "applied": applied,
+            "saved": self.recorded - applied,
+            "fifo_cycles": fifo_cycles,
+            "update_events": update_events,
+        }
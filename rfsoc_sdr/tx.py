@@ -0,0 +1,175 @@
+# M-QAM transmitter : bits -> Gray mapped symbols -> RRC pulse shaping -> int32 words for the DAC (IQ mode)
+#
+# The waveform is computed by chunks of symbols, so a DDR4 burst of millions of symbols only needs the memory of
+# its int32 words. The pulse shaping is a polyphase interpolation (dsp.PolyphaseResampler), the zeros between the
+# symbols are never multiplied.
+
+import numpy as np
+import commpy as cp
+
+from packing import float_IQ_to_int32
+from dsp import PolyphaseResampler
+
+
+def gray_qam_constellation(mod_order=16):
+    """Square M-QAM constellation with a Gray mapping on each axis.
+
+    The symbol index is the concatenation of the bits of I (high bits) and of Q (low bits), two neighbour
+    points differ by one bit. The levels are -sqrt(M)+1, ..., -1, 1, ..., sqrt(M)-1 (like commpy).
+
+    Args:
+        mod_order (int, optional): 4, 16, 64, 256 or 1024. Defaults to 16.
+
+    Returns:
+        ndarray complex128: the mod_order points, constellation[index]
+    """
+    bits_per_axis = int(np.log2(mod_order)) // 2
+    if (mod_order < 4 or 4**bits_per_axis != mod_order):
+        raise ValueError("mod_order must be a power of 4 (square QAM)")
+    side = 2**bits_per_axis
+    level = np.arange(side)
+    # The Gray code of level b is b ^ (b >> 1)
+    amplitude = np.empty(side)
+    amplitude[level ^ (level >> 1)] = 2 * level - (side - 1)
+    return (amplitude[:, None] + 1j * amplitude[None, :]).ravel()
+
+
+def bits_to_indices(bits, mod_order=16):
+    """Group the bits by log2(mod_order), most significant bit first.
+
+    Args:
+        bits (ndarray): 0/1 values, the size must be a multiple of log2(mod_order)
+        mod_order (int, optional): Defaults to 16.
+
+    Returns:
+        ndarray uint16: the symbol indices
+    """
+    bits_per_symbol = int(np.log2(mod_order))
+    bits = np.asarray(bits)
+    if (bits.size % bits_per_symbol != 0):
+        raise ValueError(f"The number of bits must be a multiple of {bits_per_symbol}")
+    weights = (1 << np.arange(bits_per_symbol - 1, -1, -1)).astype(np.uint16)
+    return bits.reshape(-1, bits_per_symbol).astype(np.uint16) @ weights
+
+
+def indices_to_bits(indices, mod_order=16):
+    """ Inverse of bits_to_indices (uint8 array of 0/1) """
+    bits_per_symbol = int(np.log2(mod_order))
+    shifts = np.arange(bits_per_symbol - 1, -1, -1)
+    return ((np.asarray(indices)[:, None] >> shifts) & 1).astype(np.uint8).ravel()
+
+
+class QamTx:
+    """M-QAM modulator producing the int32 words (I high, Q low) of the DAC IQ mode.
+
+    Example:
+        tx = QamTx(mod_order=64, samples_per_symbol=4)
+        data = tx.modulate(tx.random_indices(1_000_000))
+        sdr.load_data(1, 2, data)
+    """
+
+    def __init__(self, mod_order=16, samples_per_symbol=4, rolloff_factor=0.25, filter_span=20, amplitude=1.0):
+        """Build the constellation and the RRC filter.
+
+        Args:
+            mod_order (int, optional): 4, 16, 64, 256 or 1024. Defaults to 16.
+            samples_per_symbol (int, optional): 4, 8, 16 (4, 8, 16 for the respective interpolation factors 8, 4, 2). Defaults to 4.
+            rolloff_factor (float, optional): rolloff_factor/alpha parameters of the Root Raised Cosine filter (RRC). Defaults to 0.25.
+            filter_span (int, optional): filter span in symbols. Defaults to 20.
+            amplitude (float, optional): fraction of the int16 full scale reached by the highest possible peak. Defaults to 1.0.
+        """
+        self.mod_order = mod_order
+        self.samples_per_symbol = samples_per_symbol
+        self.filter_span = filter_span
+        self.constellation = gray_qam_constellation(mod_order)
+
+        num_taps = filter_span * samples_per_symbol + 1
+        _, self.rrc_filter = cp.filters.rrcosfilter(num_taps, rolloff_factor, samples_per_symbol, 1)
+
+        # Highest possible |sample| : all the symbols of a polyphase branch at the corner of the constellation
+        taps = np.zeros(-(-num_taps // samples_per_symbol) * samples_per_symbol)
+        taps[:num_taps] = np.abs(self.rrc_filter)
+        peak = np.max(np.abs(self.constellation)) * np.max(taps.reshape(-1, samples_per_symbol).sum(axis=0))
+        # Multiply the symbols by normalization_factor to get the int16 values (divide the rx signal by it)
+        self.normalization_factor = amplitude * (2**15 - 1) / peak
+
+    def random_indices(self, number_of_symbols, rng=None):
+        """ Random symbol indices (rng : np.random.Generator or seed) """
+        rng = np.random.default_rng(rng)
+        return rng.integers(0, self.mod_order, number_of_symbols, dtype=np.uint16)
+
+    def symbols(self, indices):
+        """ Constellation points of the symbol indices """
+        return self.constellation[indices]
+
+    def modulate_bits(self, bits, **kwargs):
+        """ modulate with the bits grouped by log2(mod_order) (see bits_to_indices) """
+        return self.modulate(bits_to_indices(bits, self.mod_order), **kwargs)
+
+    def modulate(self, indices, out=None, cyclic=True, chunk_size=1 << 16):
+        """Shape the symbols with the RRC filter and pack them in int32 words, chunk by chunk.
+
+        The output is aligned like np.convolve(upsampled_symbols, rrc_filter, "same"). With cyclic=True the
+        symbols are seen as periodic (the filter wraps around), so the waveform loops in the DAC memory without
+        a transient, else the symbols before the first one and after the last one are 0.
+
+        Args:
+            indices (ndarray): symbol indices (see random_indices and bits_to_indices)
+            out (ndarray int32, optional): output array (e.g. a np.memmap) of indices.size * samples_per_symbol words. Defaults to None.
+            cyclic (bool, optional): periodic waveform. Defaults to True.
+            chunk_size (int, optional): number of symbols shaped at once. Defaults to 64k.
+
+        Returns:
+            ndarray int32: indices.size * samples_per_symbol words, ready for SdrOverlay.load_data
+        """
+        indices = np.asarray(indices)
+        N = indices.size
+        L = self.samples_per_symbol
+        span = self.filter_span
+        if out is None:
+            out = np.empty(N * L, dtype=np.int32)
+        elif (out.size != N * L):
+            raise ValueError(f"out must have {N * L} elements, got {out.size}")
+
+        resampler = PolyphaseResampler(L, taps=self.rrc_filter)
+        # span symbols before the first one and after the last one (the other end of the waveform if cyclic, else 0),
+        # the output starts after them and after the delay of the filter ("same" alignment)
+        windows = [(-span, 0)] + [(start, min(start + chunk_size, N)) for start in range(0, N, chunk_size)] + [(N, N + span)]
+        skip = span * L + resampler.delay
+        written = 0
+        for start, stop in windows:
+            window = np.arange(start, stop)
+            if cyclic:
+                symbols = self.constellation[indices.take(window, mode="wrap")]
+            else:
+                valid = (window >= 0) & (window < N)
+                symbols = np.zeros(window.size, dtype=complex)
+                symbols[valid] = self.constellation[indices[window[valid]]]
+            shaped = resampler.process(symbols)
+            dropped = min(skip, shaped.size)
+            skip -= dropped
+            shaped = shaped[dropped:dropped + N * L - written]
+            float_IQ_to_int32(shaped.real, shaped.imag, scale=self.normalization_factor, out=out[written:written + shaped.size])
+            written += shaped.size
+        return out
+
+
+def qam_gen(N=6400, mod_order=16, samples_per_symbol=4, rolloff_factor=0.25, filter_span=20, rng=None, cyclic=True):
+    """Generate a 1-D ndarray of np.int32 data of QAM modulation for the DAC inside an RFSOC (Xilinx FPGA)
+
+    Args:
+        N (int, optional): Number of symbols. Defaults to 6400.
+        mod_order (int, optional): 16 or 64 or ... . Defaults to 16.
+        samples_per_symbol (int, optional): 4, 8, 16 (4, 8, 16 for the respective interpolation factors 8, 4, 2). Defaults to 4.
+        rolloff_factor (float, optional): rolloff_factor/alpha parameters for the Raised Root Cosine Filter (RRC). Defaults to 0.25.
+        filter_span (int, optional): filter span. Defaults to 20.
+        rng (np.random.Generator or int, optional): random generator or seed of the bits. Defaults to None.
+        cyclic (bool, optional): periodic waveform (see QamTx.modulate). Defaults to True.
+
+    Returns:
+        data, symbols, rrc_filter, normalization_factor : the 32 bits data array, the complex symbols sent, the rrc filter coeff and the normalization factor
+    """
+    tx = QamTx(mod_order, samples_per_symbol, rolloff_factor, filter_span)
+    indices = tx.random_indices(N, rng)
+    data = tx.modulate(indices, cyclic=cyclic)
+    return data, tx.symbols(indices), tx.rrc_filter, tx.normalization_factor
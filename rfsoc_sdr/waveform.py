@@ -0,0 +1,148 @@
+# Binary waveform files (.wfm) : a 64 bytes header followed by the raw int32 words of the DAC memory
+#
+# Header (little endian) :
+#   magic (8s) "RFSDRWF\0", version (H), mode (B) 0 : Real / 1 : IQ, tile (B), dac (B) (0xFF : not set),
+#   interpolation (H) (0 : not set), Fs (d) MHz, nco (d) MHz, number of 32 bits samples (Q), crc32 of the words (I)
+# The words start at HEADER_SIZE, the file can be mapped with numpy.memmap (see read_waveform).
+
+import struct
+import zlib
+import numpy as np
+
+from data import read_file, read_hex_file
+
+MAGIC = b"RFSDRWF\0"
+VERSION = 1
+HEADER_FORMAT = "<8sHBBBxHddQI"
+HEADER_SIZE = 64
+NOT_SET = 0xFF
+
+MODES = ["Real", "IQ"]
+
+# Number of 32 bits samples read at once for the checksum
+CHUNK_SIZE = 1 << 20
+
+
+def _crc32(words):
+    """ crc32 of the words, computed by chunks (does not load a memmap at once) """
+    crc = 0
+    for start in range(0, words.size, CHUNK_SIZE):
+        crc = zlib.crc32(np.ascontiguousarray(words[start:start + CHUNK_SIZE]), crc)
+    return crc
+
+
+def write_waveform(file_name, data, Fs=0.0, mode="Real", nco=0.0, interpolation=None, tile=None, dac=None):
+    """Write the int32 words of a waveform in a binary waveform file.
+
+    Args:
+        file_name (str)
+        data (numpy.ndarray int32): array numpy already formatted in the correct int32 format
+        Fs (float, optional): sampling rate of the DAC in MHz. Defaults to 0.0 (not set).
+        mode (str, optional): "Real" or "IQ". Defaults to "Real".
+        nco (float, optional): NCO frequency in MHz (IQ mode). Defaults to 0.0.
+        interpolation (int, optional): interpolation factor. Defaults to None.
+        tile (int, optional): target tile. Defaults to None.
+        dac (int, optional): target dac. Defaults to None.
+
+    Returns:
+        dict: the header written
+    """
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}")
+    if (tile is None) != (dac is None):
+        raise ValueError("tile and dac must be set together")
+    words = np.ascontiguousarray(data, dtype="<i4").ravel()
+    header = {
+        "mode": mode,
+        "tile": tile,
+        "dac": dac,
+        "interpolation": interpolation,
+        "Fs": float(Fs),
+        "nco": float(nco),
+        "number_of_32bits_samples": int(words.size),
+        "crc32": _crc32(words),
+    }
+    raw = struct.pack(HEADER_FORMAT, MAGIC, VERSION, MODES.index(mode),
+                      NOT_SET if tile is None else tile, NOT_SET if dac is None else dac,
+                      0 if interpolation is None else interpolation,
+                      header["Fs"], header["nco"], header["number_of_32bits_samples"], header["crc32"])
+    with open(file_name, "wb") as f:
+        f.write(raw.ljust(HEADER_SIZE, b"\0"))
+        words.tofile(f)
+    return header
+
+
+def read_waveform_header(file_name):
+    """Read the header of a binary waveform file.
+
+    Args:
+        file_name (str)
+
+    Returns:
+        dict: mode, tile, dac, interpolation, Fs (MHz), nco (MHz), number_of_32bits_samples, crc32
+    """
+    with open(file_name, "rb") as f:
+        raw = f.read(HEADER_SIZE)
+    if (len(raw) != HEADER_SIZE or raw[:len(MAGIC)] != MAGIC):
+        raise ValueError(f"{file_name} is not a waveform file")
+    magic, version, mode, tile, dac, interpolation, Fs, nco, size, crc = struct.unpack_from(HEADER_FORMAT, raw)
+    if (version > VERSION):
+        raise ValueError(f"{file_name} : version {version} of the waveform format is not supported")
+    if (mode >= len(MODES)):
+        raise ValueError(f"{file_name} : invalid mode {mode}")
+    return {
+        "mode": MODES[mode],
+        "tile": None if tile == NOT_SET else tile,
+        "dac": None if dac == NOT_SET else dac,
+        "interpolation": None if interpolation == 0 else interpolation,
+        "Fs": Fs,
+        "nco": nco,
+        "number_of_32bits_samples": size,
+        "crc32": crc,
+    }
+
+
+def read_waveform(file_name, mmap=True, check=False):
+    """Read a binary waveform file.
+
+    Args:
+        file_name (str)
+        mmap (bool, optional): map the words (read only) instead of reading them in memory. Defaults to True.
+        check (bool, optional): compare the crc32 of the words with the header. Defaults to False.
+
+    Returns:
+        tuple: (data, header) the int32 words and the header (see read_waveform_header)
+    """
+    header = read_waveform_header(file_name)
+    size = header["number_of_32bits_samples"]
+    if mmap:
+        data = np.memmap(file_name, dtype="<i4", mode="r", offset=HEADER_SIZE, shape=(size,))
+    else:
+        data = np.fromfile(file_name, dtype="<i4", count=size, offset=HEADER_SIZE)
+        if (data.size != size):
+            raise ValueError(f"{file_name} is truncated : {data.size} of {size} 32 bits samples")
+    if check and _crc32(data) != header["crc32"]:
+        raise ValueError(f"{file_name} : wrong checksum, the file is corrupted")
+    return data, header
+
+
+def text_to_waveform(text_file_name, file_name, fmt="dec", swap_halfwords=False, **metadata):
+    """Convert a text waveform (one word per line) into a binary waveform file.
+
+    Args:
+        text_file_name (str): file written by data.write_file ("dec") or a hex file ("hex", see data.read_hex_file)
+        file_name (str): binary waveform file
+        fmt (str, optional): "dec" or "hex". Defaults to "dec".
+        swap_halfwords (bool, optional): swap the 16 bits halves of the hex words (see data.read_hex_file). Defaults to False.
+        **metadata: Fs, mode, nco, interpolation, tile and dac (see write_waveform)
+
+    Returns:
+        dict: the header written
+    """
+    if (fmt == "dec"):
+        data = read_file(text_file_name)
+    elif (fmt == "hex"):
+        data = read_hex_file(text_file_name, swap_halfwords=swap_halfwords).view(np.int32)
+    else:
+        raise ValueError("fmt must be \"dec\" or \"hex\"")
+    return write_waveform(file_name, data, **metadata)